@@ -1,3 +1,4 @@
+import os
 import yaml
 
 from snake.snake import test_all
@@ -7,7 +8,7 @@ with open("snake/difficulties.yaml", "r") as f:
 
 DIFFICULTIES = CONFIG["difficulties"]
 
-results = test_all(1000, DIFFICULTIES)
+results = test_all(1000, DIFFICULTIES, workers=os.cpu_count())
 
 avg = (results["easy"] + results["medium"] + results["hard"] + results["chaos"]) / 4
 
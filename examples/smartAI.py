@@ -7,18 +7,13 @@ def smartAI(state: GameState) -> Turn:
     # Find safe moves
     safe = []
 
-    enemy_bodies = set()
-    for snake in state.enemies:
-        enemy_bodies |= snake.body_set
-
     for turn in list(Turn):
         head = state.snake.get_next_head(turn)
         if (
             0 <= head[0] < state.width
             and 0 <= head[1] < state.height
             and head not in state.walls
-            and head not in state.snake.body
-            and head not in enemy_bodies
+            and state.owner_at(head) is None
         ):
             safe.append(turn)
 
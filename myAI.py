@@ -27,8 +27,9 @@ def simulateTurn(game: PatchedSnakeGame, food) -> PatchedSnakeGame | None:
 
 def lookAhead(state: GameState) -> Turn:
     original_length = len(state.snake.body_set)
+    base_game = PatchedSnakeGame(state)
     for nth_food in range(len(set(state.food))):
-        game = PatchedSnakeGame(state)
+        game = base_game.clone()
         food = nthClosestApple(state, nth_food)
         for _ in range(1000):
             game = simulateTurn(game, food)
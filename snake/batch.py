@@ -0,0 +1,422 @@
+import random
+
+import numpy as np
+
+from snake.logic import SnakeGame, Turn, DIRECTIONS
+
+# cell values in the grid, snake i is stored as SNAKE + i
+EMPTY = 0
+WALL = 1
+FOOD = 2
+SNAKE = 3
+
+_DX = np.array([d[0] for d in DIRECTIONS])
+_DY = np.array([d[1] for d in DIRECTIONS])
+
+
+# popcount that also works on python 3.9
+def _count(mask):
+    return bin(mask).count("1")
+
+
+class BitGrid:
+    """
+    Bitmask helpers for a width x height board, cell (x, y) is bit y * width + x.
+    """
+
+    def __init__(self, width, height):
+        w, h = width, height
+        self.width = width
+        self.height = height
+        self.full = (1 << (w * h)) - 1
+
+        # cells that can move one step without wrapping around a row
+        row = (1 << w) - 1
+        left = sum(1 << (y * w) for y in range(h))
+        right = left << (w - 1)
+        self.not_left = self.full & ~left
+        self.not_right = self.full & ~right
+
+        self.borders = [left, right, row, row << ((h - 1) * w)]
+        self.border = left | right | row | (row << ((h - 1) * w))
+
+    def bit(self, cell):
+        return 1 << (cell[1] * self.width + cell[0])
+
+    # grows a mask by one cell in the four cardinal directions
+    def dilate4(self, mask):
+        return (
+            mask
+            | ((mask & self.not_right) << 1)
+            | ((mask & self.not_left) >> 1)
+            | ((mask << self.width) & self.full)
+            | (mask >> self.width)
+        )
+
+    # grows a mask by one cell in all eight directions
+    def dilate8(self, mask):
+        mask |= ((mask & self.not_right) << 1) | ((mask & self.not_left) >> 1)
+        return mask | ((mask << self.width) & self.full) | (mask >> self.width)
+
+    # checks a new wall at pos against the SnakeGame.spawn_wall rules
+    # walls must already include pos
+    # returns whether the wall is allowed and the buffer zone to add to the
+    # invalid wall cache, which is added even if the wall is refused
+    def wall_allowed(self, walls, pos):
+        w, h = self.width, self.height
+        b = self.bit(pos)
+
+        # checks if any adjacent cell would have 3+ walls
+        # out of bounds cells count as walls
+        x, y = pos
+        for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            if 0 <= nx < w and 0 <= ny < h and not (walls & self.bit((nx, ny))):
+                count = (
+                    (ny == 0 or bool(walls & self.bit((nx, ny - 1))))
+                    + (nx == w - 1 or bool(walls & self.bit((nx + 1, ny))))
+                    + (ny == h - 1 or bool(walls & self.bit((nx, ny + 1))))
+                    + (nx == 0 or bool(walls & self.bit((nx - 1, ny))))
+                )
+                if count >= 3:
+                    return False, 0
+
+        # finds connected wall cluster by flood filling the wall mask
+        cluster = b
+        while True:
+            grown = self.dilate8(cluster) & walls
+            if grown == cluster:
+                break
+            cluster = grown
+
+        # checks border touches
+        borders = sum(1 for m in self.borders if cluster & m)
+
+        # invalid if touches 2+ borders
+        if borders >= 2:
+            return False, 0
+
+        buffer = 0
+        if borders:
+            # adds buffer zone around border-touching clusters
+            buffer = self.dilate4(self.dilate4(cluster)) & ~walls
+
+            # checks for nearby border walls not in cluster
+            nearby = self.dilate8(self.dilate8(cluster))
+            if nearby & walls & ~cluster & self.border:
+                return False, buffer
+
+        # checks if wall has 3+ neighbors
+        if _count(walls) > 4:
+            if _count(self.dilate4(b) & walls & ~b) >= 3:
+                return False, buffer
+
+        return True, buffer
+
+
+class BatchSnakeGame:
+    """
+    Plays many games of one difficulty in lockstep as stacked numpy arrays.
+
+    Game b is laid out as:
+        grid[b]         (height, width) cell values, see EMPTY/WALL/FOOD/SNAKE
+        body[b, s]      ring buffer of cell indices y * width + x, head first
+        head_ptr[b, s]  index of the head in the ring buffer
+        length[b, s]    number of body segments
+        direction[b, s], alive[b, s], score[b, s]
+
+    step() takes a (num_games, num_snakes) array of Turn values and moves
+    every snake of every unfinished game with the same rules as SnakeGame.
+    Snakes move one after the other in index order, as they do in the
+    reference game, so later snakes see the earlier moves of the tick.
+
+    Each game draws its random cells from its own random.Random(seed). With
+    record=True the turns and draws are kept so cross_check() can replay
+    games through the reference SnakeGame and compare the results.
+    """
+
+    def __init__(
+        self,
+        num_games,
+        width=10,
+        height=10,
+        num_enemies=1,
+        num_food=5,
+        max_moves=1000,
+        seeds=None,
+        record=False,
+    ):
+        self.num_games = num_games
+        self.width = width
+        self.height = height
+        self.num_enemies = num_enemies
+        self.num_snakes = num_enemies + 1
+        self.num_food = num_food
+        self.max_moves = max_moves
+        self.record = record
+
+        if seeds is None:
+            seeds = [random.randrange(2**32) for _ in range(num_games)]
+        self.reset(seeds)
+
+    def reset(self, seeds):
+        B, S, cells = self.num_games, self.num_snakes, self.width * self.height
+        self.seeds = list(seeds)
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+
+        self.grid = np.zeros((B, self.height, self.width), dtype=np.int16)
+        self._flat = self.grid.reshape(B, cells)
+
+        # the player's body after it died, it still blocks other snakes but
+        # new food and walls may be placed on it
+        self.corpse = np.zeros((B, cells), dtype=bool)
+        self.invalid_wall_cache = np.zeros((B, cells), dtype=bool)
+
+        self.body = np.zeros((B, S, cells), dtype=np.int32)
+        self.head_ptr = np.zeros((B, S), dtype=np.int32)
+        self.length = np.ones((B, S), dtype=np.int32)
+        self.direction = np.zeros((B, S), dtype=np.int8)
+        self.alive = np.ones((B, S), dtype=bool)
+        self.score = np.zeros((B, S), dtype=np.int32)
+
+        # walls are also kept as bitmasks to run the wall rules on
+        self.board = BitGrid(self.width, self.height)
+        self.wall_masks = [0] * B
+
+        self.food_count = np.zeros(B, dtype=np.int32)
+        self.wall_count = np.zeros(B, dtype=np.int32)
+        self.moves = np.zeros(B, dtype=np.int32)
+        self.game_over = np.zeros(B, dtype=bool)
+
+        # turns played per tick and random draws made per game
+        self.turn_log = []
+        self.draws = [[] for _ in range(B)]
+
+        for b in range(B):
+            for _ in range(self.num_food):
+                self._spawn_food(b)
+
+            for s in range(S):
+                cell = self._random_cell(b, self._flat[b] == EMPTY)
+                self.body[b, s, 0] = cell
+                self._flat[b, cell] = SNAKE + s
+                self.direction[b, s] = self._random_direction(b)
+
+    # the flat cell index of every snake's head, shape (num_games, num_snakes)
+    @property
+    def heads(self):
+        return np.take_along_axis(self.body, self.head_ptr[:, :, None], 2)[:, :, 0]
+
+    # the cells of one snake from head to tail
+    def body_cells(self, b, s):
+        idx = (self.head_ptr[b, s] - np.arange(self.length[b, s])) % self.body.shape[2]
+        return self.body[b, s, idx]
+
+    def step(self, turns):
+        turns = np.asarray(turns)
+        B, W, H = self.num_games, self.width, self.height
+        cells = W * H
+        games = np.arange(B)
+
+        # like the reference loop, game over is only checked once per tick
+        playing = ~self.game_over
+        if self.record:
+            self.turn_log.append((playing, turns.astype(np.int8)))
+
+        for s in range(self.num_snakes):
+            active = playing & self.alive[:, s]
+            if not active.any():
+                continue
+
+            new_dir = (self.direction[:, s] + turns[:, s]) % 4
+            head = self.body[games, s, self.head_ptr[:, s]]
+            x = head % W + _DX[new_dir]
+            y = head // W + _DY[new_dir]
+
+            out = (x < 0) | (x >= W) | (y < 0) | (y >= H)
+            cell = np.where(out, 0, y * W + x)
+            content = self._flat[games, cell]
+
+            # the tail moves out of the way, so only our own tail is allowed
+            tail_ptr = (self.head_ptr[:, s] - self.length[:, s] + 1) % cells
+            tail = self.body[games, s, tail_ptr]
+            own_tail = (content == SNAKE + s) & (cell == tail)
+
+            blocked = (
+                out
+                | (content == WALL)
+                | self.corpse[games, cell]
+                | ((content >= SNAKE) & ~own_tail)
+            )
+            moved = active & ~blocked
+            eats = moved & (content == FOOD)
+
+            # pops the tails of snakes that didn't eat, then pushes the heads
+            m = np.flatnonzero(moved)
+            shrink = m[~eats[m]]
+            self._flat[shrink, tail[shrink]] = EMPTY
+            self.length[shrink, s] -= 1
+
+            ptr = (self.head_ptr[m, s] + 1) % cells
+            self.head_ptr[m, s] = ptr
+            self.body[m, s, ptr] = cell[m]
+            self.length[m, s] += 1
+            self._flat[m, cell[m]] = SNAKE + s
+            self.direction[m, s] = new_dir[m]
+
+            for b in np.flatnonzero(eats):
+                self.food_count[b] -= 1
+                if self.food_count[b] < self.num_food:
+                    self._spawn_food(b)
+                self.score[b, s] += 1
+                self._spawn_wall(b)
+
+            for b in np.flatnonzero(active & blocked):
+                self._kill_snake(b, s)
+
+            if s == 0:
+                self.moves[active] += 1
+                self.game_over |= active & (
+                    ~self.alive[:, 0] | (self.moves >= self.max_moves)
+                )
+
+    # plays every game to the end, the policy maps this batch to turns
+    def play(self, policy):
+        while not self.game_over.all():
+            self.step(policy(self))
+        return self.score[:, 0].copy()
+
+    def _kill_snake(self, b, s):
+        self.alive[b, s] = False
+        body = self.body_cells(b, s)
+
+        # the player's body is no longer occupied once it dies
+        if s == 0:
+            self._flat[b, body] = EMPTY
+            self.corpse[b, body] = True
+            return
+
+        # a dead enemy turns into food
+        self._flat[b, body] = FOOD
+        self.food_count[b] += len(body)
+
+    def _spawn_food(self, b):
+        free = self._flat[b] == EMPTY
+        if free.any():
+            self._flat[b, self._random_cell(b, free)] = FOOD
+            self.food_count[b] += 1
+
+    # spawns a wall with the same placement rules as SnakeGame.spawn_wall
+    def _spawn_wall(self, b):
+        if self.wall_count[b] >= self.width * self.height * 0.25:
+            return
+
+        candidates = (self._flat[b] == EMPTY) & ~self.invalid_wall_cache[b]
+        if not candidates.any():
+            return
+
+        pos = self._random_cell(b, candidates)
+        walls = self.wall_masks[b] | (1 << pos)
+        cell = (pos % self.width, pos // self.width)
+        allowed, buffer = self.board.wall_allowed(walls, cell)
+        while buffer:
+            low = buffer & -buffer
+            self.invalid_wall_cache[b, low.bit_length() - 1] = True
+            buffer ^= low
+
+        if allowed:
+            self._flat[b, pos] = WALL
+            self.wall_masks[b] = walls
+            self.wall_count[b] += 1
+        else:
+            self.invalid_wall_cache[b, pos] = True
+
+    # picks a uniformly random cell index where the mask is set
+    def _random_cell(self, b, mask):
+        free = np.flatnonzero(mask)
+        cell = int(free[self.rngs[b].randrange(len(free))])
+        if self.record:
+            self.draws[b].append((cell % self.width, cell // self.width))
+        return cell
+
+    def _random_direction(self, b):
+        direction = self.rngs[b].randint(0, 3)
+        if self.record:
+            self.draws[b].append(direction)
+        return direction
+
+    def cross_check(self, sample=8, games=None):
+        """
+        Replays games through the reference SnakeGame and compares the result.
+
+        The replayed game plays the recorded turns and takes its random
+        cells and directions from the batch game's draws, checking that each
+        drawn cell was a legal choice for the reference engine too. Returns
+        the indices of the games that didn't match.
+        """
+        if not self.record:
+            raise ValueError("cross_check needs a game created with record=True")
+
+        if games is None:
+            rng = random.Random(self.seeds[0])
+            games = rng.sample(range(self.num_games), min(sample, self.num_games))
+
+        return [b for b in games if not self._replay_matches(b)]
+
+    def _replay_matches(self, b):
+        try:
+            game = _ReplayGame(
+                self.draws[b],
+                width=self.width,
+                height=self.height,
+                num_enemies=self.num_enemies,
+                num_food=self.num_food,
+                max_moves=self.max_moves,
+            )
+            for playing, turns in self.turn_log:
+                if not playing[b]:
+                    break
+                for i in range(len(game.snakes)):
+                    if game.snakes[i].isAlive:
+                        game.move_snake(i, Turn(int(turns[b, i])))
+        except ValueError:
+            return False
+
+        cell = lambda c: (int(c) % self.width, int(c) // self.width)
+        food = {cell(c) for c in np.flatnonzero(self._flat[b] == FOOD)}
+        walls = {cell(c) for c in np.flatnonzero(self._flat[b] == WALL)}
+        return (
+            game.game_over == self.game_over[b]
+            and game.moves == self.moves[b]
+            and game.food == food
+            and game.walls == walls
+            and all(
+                snake.isAlive == self.alive[b, s]
+                and snake.score == self.score[b, s]
+                and snake.direction == self.direction[b, s]
+                and list(snake.body) == [cell(c) for c in self.body_cells(b, s)]
+                for s, snake in enumerate(game.snakes)
+            )
+        )
+
+
+# a reference game whose random choices are read from a batch game's draws
+class _ReplayGame(SnakeGame):
+    def __init__(self, draws, **kwargs):
+        self._draws = iter(draws)
+        super().__init__(**kwargs)
+
+    def _next_draw(self):
+        try:
+            return next(self._draws)
+        except StopIteration:
+            raise ValueError("the reference game made more random draws")
+
+    def _random_cell(self, cells):
+        pos = self._next_draw()
+        if pos not in cells:
+            raise ValueError(f"{pos} is not a legal choice in the reference game")
+        return pos
+
+    def _random_direction(self):
+        return self._next_draw()
+
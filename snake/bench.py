@@ -0,0 +1,196 @@
+import json
+import os
+import platform
+import time
+
+from snake.logic import SnakeGame, Turn
+from snake.render import make_frame
+from examples.smartAI import smartAI
+
+# larger boards than the difficulties, to show how the engine scales
+SYNTHETIC = {
+    "large": {
+        "width": 50,
+        "height": 50,
+        "num_enemies": 10,
+        "max_moves": 1000,
+        "num_food": 30,
+    },
+    "huge": {
+        "width": 150,
+        "height": 150,
+        "num_enemies": 30,
+        "max_moves": 1000,
+        "num_food": 100,
+    },
+}
+
+# ticks played before timing, so the board has grown snakes and walls
+WARMUP_TICKS = 60
+
+# times beyond the baseline by more than this fraction are regressions
+DEFAULT_THRESHOLD = 0.2
+
+
+# plays one tick with every snake steered by the example AI
+def _tick(game):
+    for i in range(len(game.snakes)):
+        if game.snakes[i].isAlive:
+            game.move_snake(i, smartAI(game.getGameState(i)))
+
+
+# best time of op in microseconds, calling setup untimed before each call
+# ops that don't change the game are timed over runs of calls instead, as
+# they take about as long as reading the clock
+def _time(op, n, setup=None, runs=1):
+    times = []
+    for _ in range(n):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(runs):
+            op()
+        times.append((time.perf_counter() - start) / runs)
+    return min(times) * 1e6
+
+
+def _new_game(cfg, seed):
+    return SnakeGame(
+        width=cfg["width"],
+        height=cfg["height"],
+        num_enemies=cfg["num_enemies"],
+        max_moves=cfg["max_moves"],
+        num_food=cfg["num_food"],
+        seed=seed,
+    )
+
+
+# times each primitive on one board, in microseconds per call
+def bench_board(cfg, n=200, games=3):
+    game = _new_game(cfg, seed=0)
+    for _ in range(WARMUP_TICKS):
+        if game.game_over:
+            break
+        _tick(game)
+    snapshot = game.snapshot()
+
+    # goes back to the snapshot, copying everything shared with it up front
+    # so the copy on write isn't timed as part of the next call
+    def restore():
+        game.restore(snapshot)
+        for name in game._cow_attrs:
+            game._own(name)
+        for i in range(len(game.snakes)):
+            game._own_snake(i)
+
+    def move():
+        game._move_snake(game.snakes[0], Turn.STRAIGHT)
+
+    results = {
+        "reset": _time(lambda: game.reset(0), max(1, n // 10)),
+        "spawn_food": _time(game.spawn_food, n, restore),
+        "spawn_wall": _time(game.spawn_wall, n, restore),
+        "_move_snake": _time(move, n, restore),
+    }
+
+    restore()
+    results["get_empty_cells"] = _time(game.get_empty_cells, n, runs=50)
+    results["getGameState"] = _time(lambda: game.getGameState(0), n, runs=50)
+
+    # renderer push without a window, i.e. making the frame it buffers
+    state = game.getGameState(0)
+    prev = make_frame(state)
+    results["render_push"] = _time(lambda: make_frame(state, prev), n, runs=10)
+
+    # whole games, engine and example AI together
+    ticks = 0
+    start = time.perf_counter()
+    for seed in range(games):
+        game = _new_game(cfg, seed)
+        while not game.game_over:
+            _tick(game)
+            ticks += 1
+    results["tick"] = (time.perf_counter() - start) / ticks * 1e6
+    return results
+
+
+# times every board, returning a json-ready report
+def bench(DIFFICULTIES, n=200, games=3):
+    boards = {**DIFFICULTIES, **SYNTHETIC}
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "us per call, ticks are whole game ticks",
+        "results": {},
+    }
+    for name, cfg in boards.items():
+        report["results"][name] = bench_board(cfg, n, games)
+        print(f"  {name:<12} done")
+    return report
+
+
+# returns (board, primitive, baseline, current) for every slower time
+def regressions(report, baseline, threshold=DEFAULT_THRESHOLD):
+    slower = []
+    for name, times in report["results"].items():
+        for primitive, us in times.items():
+            base = baseline["results"].get(name, {}).get(primitive)
+            if base is not None and us > base * (1 + threshold):
+                slower.append((name, primitive, base, us))
+    return slower
+
+
+def print_report(report, baseline=None):
+    print("\nResults (us per call):")
+    for name, times in report["results"].items():
+        print(f"  {name}")
+        for primitive, us in times.items():
+            line = f"    {primitive:<16} {us:>10.2f}"
+            base = None
+            if baseline is not None:
+                base = baseline["results"].get(name, {}).get(primitive)
+            if base:
+                line += f"  {(us - base) / base:+7.1%} vs {base:.2f}"
+            print(line)
+
+
+# runs the benchmarks, saving them to output and comparing them to baseline
+# returns false if any time regressed
+def run_bench(
+    DIFFICULTIES,
+    output="bench.json",
+    baseline="bench_baseline.json",
+    save_baseline=False,
+    threshold=DEFAULT_THRESHOLD,
+):
+    print("Benchmarking engine primitives")
+    report = bench(DIFFICULTIES)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if save_baseline:
+        with open(baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print_report(report)
+        print(f"\nSaved baseline to {baseline}")
+        return True
+
+    if not os.path.exists(baseline):
+        print_report(report)
+        print(f"\nNo baseline at {baseline}, save one with --save-baseline")
+        return True
+
+    with open(baseline) as f:
+        base = json.load(f)
+    print_report(report, base)
+
+    slower = regressions(report, base, threshold)
+    if slower:
+        print(f"\nRegressions (over {threshold:.0%} slower than {baseline}):")
+        for name, primitive, before, after in slower:
+            print(f"  {name} {primitive}: {before:.2f} -> {after:.2f} us")
+        return False
+
+    print(f"\nNo regressions against {baseline}")
+    return True
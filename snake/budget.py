@@ -0,0 +1,84 @@
+import multiprocessing
+import random
+import time
+import traceback
+
+from snake.logic import GameState, Turn
+
+
+# runs in the worker process, answering states with turns until closed
+# a state can come with a seed for random, so AIs that use it are seeded
+# the same as when they run in the game's process
+def _serve(conn, policy):
+    while True:
+        try:
+            state, seed = conn.recv()
+        except EOFError:
+            return
+
+        if seed is not None:
+            random.seed(seed)
+        try:
+            conn.send((policy(state), None))
+        except Exception:
+            conn.send((None, traceback.format_exc()))
+
+
+class TimedAI:
+    """
+    Runs an AI in a persistent worker process with a time limit per move.
+
+    Each state is given a deadline before it is sent, so anytime AIs can
+    check state.time_left(). A move that misses its deadline is counted in
+    timeouts and the fallback turn is played instead. The worker still busy
+    with it is replaced, so one slow move can't hold up the moves after it.
+    """
+
+    def __init__(self, policy, time_limit, fallback=Turn.STRAIGHT):
+        self.policy = policy
+        self.time_limit = time_limit
+        self.fallback = fallback
+        self.timeouts = 0
+        self._worker = None
+        self._conn = None
+        self._seed = None
+
+    # seeds random in the worker before the next move
+    def seed(self, seed):
+        self._seed = seed
+
+    def __call__(self, state: GameState):
+        if self._worker is None:
+            self.start()
+
+        state.deadline = time.perf_counter() + self.time_limit
+        self._conn.send((state, self._seed))
+        self._seed = None
+
+        if not self._conn.poll(max(0.0, state.time_left())):
+            self.timeouts += 1
+            self.close()
+            return self.fallback
+
+        turn, error = self._conn.recv()
+        if error is not None:
+            raise RuntimeError(f"AI raised an exception:\n{error}")
+        return turn
+
+    # starts the worker, which the first move does otherwise
+    def start(self):
+        self._conn, child = multiprocessing.Pipe()
+        self._worker = multiprocessing.Process(
+            target=_serve, args=(child, self.policy), daemon=True
+        )
+        self._worker.start()
+        child.close()
+
+    # stops the worker, a new one is started for the next move
+    def close(self):
+        if self._worker is not None:
+            self._worker.terminate()
+            self._worker.join()
+            self._conn.close()
+            self._worker = None
+            self._conn = None
@@ -0,0 +1,189 @@
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import time
+
+from snake.test import GameResult
+
+DEFAULT_PATH = ".snake_cache.db"
+
+# entries not used for this many seconds are evicted, and past this many
+# entries the least recently used are
+MAX_AGE = 30 * 24 * 60 * 60
+MAX_ENTRIES = 200_000
+
+# config values that only change how a game is shown
+_DISPLAY_KEYS = ("moves_per_second",)
+
+# the modules that play a game and run the player's AI
+_RUNNER_MODULES = ("snake.test", "snake.budget")
+
+
+# the in project modules a module's source imports, found without running it
+def _imports(source):
+    names = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.append(node.module)
+            names += [f"{node.module}.{alias.name}" for alias in node.names]
+    return names
+
+
+# hashes the source of a module and of every module it imports from this
+# project, so editing any of them changes the hash
+# with recursive=False only the module itself is hashed
+def source_hash(name, recursive=True, root=None):
+    root = os.path.abspath(root or os.getcwd())
+    sources = {}
+    names = [name]
+    while names:
+        try:
+            spec = importlib.util.find_spec(names.pop())
+        except (ImportError, ValueError):
+            continue
+
+        path = spec and spec.origin
+        if not path or not path.endswith(".py") or path in sources:
+            continue
+        if not os.path.abspath(path).startswith(root):
+            continue
+
+        with open(path, "rb") as f:
+            sources[path] = f.read()
+        if recursive:
+            names += _imports(sources[path])
+
+    digest = hashlib.sha256()
+    for path in sorted(sources):
+        digest.update(os.path.relpath(path, root).encode())
+        digest.update(sources[path])
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Results of games played before, kept on disk between runs.
+
+    A game is keyed by a hash of the player's and enemies' AIs with the
+    project modules they import, the engine and game loop, the difficulty's
+    config and the game's seed, so editing anything else keeps its result.
+    This assumes the AIs play the same moves given the same seed, so games
+    with a move_time_limit, where an AI may play by the clock, are never
+    cached. Use as a context manager, entries are evicted by age and count
+    as it closes.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_PATH,
+        player="myAI",
+        enemy="examples.smartAI",
+        max_age=MAX_AGE,
+        max_entries=MAX_ENTRIES,
+    ):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS games "
+            "(key TEXT PRIMARY KEY, result TEXT NOT NULL, used REAL NOT NULL)"
+        )
+
+        self._code = {
+            "player": source_hash(player),
+            "enemy": source_hash(enemy),
+            "runner": [source_hash(m, recursive=False) for m in _RUNNER_MODULES],
+            "engine": source_hash("snake.logic"),
+        }
+
+        # (difficulty, game) -> key of the games looked up but not cached
+        self._keys = {}
+        self._stored = 0
+
+    def key(self, task):
+        cfg = {k: v for k, v in task.cfg.items() if k not in _DISPLAY_KEYS}
+        parts = {
+            **self._code,
+            "cfg": cfg,
+            "seed": task.seed,
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    # splits tasks into those still to play and the results of cached games
+    # games that need a record or timings, have a time limit or are of
+    # another AI than the cache's player are always played
+    def lookup(self, tasks):
+        now = time.time()
+        todo, cached = [], []
+        for task in tasks:
+            uncacheable = task.player is not None or "move_time_limit" in task.cfg
+            if task.record or task.timing or uncacheable:
+                todo.append(task)
+                continue
+
+            key = self.key(task)
+            row = self.db.execute(
+                "SELECT result FROM games WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._keys[task.difficulty, task.game] = key
+                todo.append(task)
+                continue
+
+            self.db.execute("UPDATE games SET used = ? WHERE key = ?", (now, key))
+            result = GameResult(task.difficulty, task.game, task.seed, cached=True)
+            for name, value in json.loads(row[0]).items():
+                setattr(result, name, value)
+            cached.append(result)
+
+        self.db.commit()
+        return todo, cached
+
+    # keeps the result of a game that was looked up
+    def store(self, result):
+        key = self._keys.pop((result.difficulty, result.game), None)
+        if key is None:
+            return
+
+        value = {
+            "score": result.score,
+            "moves": result.moves,
+            "death": result.death,
+            "seconds": result.seconds,
+        }
+        self.db.execute(
+            "INSERT OR REPLACE INTO games VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time()),
+        )
+
+        # commits now and then, so a run that's stopped keeps most of its games
+        self._stored += 1
+        if self._stored % 50 == 0:
+            self.db.commit()
+
+    # drops entries unused for max_age, then the least recently used past
+    # max_entries
+    def evict(self):
+        oldest = time.time() - self.max_age
+        self.db.execute("DELETE FROM games WHERE used < ?", (oldest,))
+        self.db.execute(
+            "DELETE FROM games WHERE key IN "
+            "(SELECT key FROM games ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
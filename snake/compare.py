@@ -0,0 +1,116 @@
+import math
+import random
+
+from tqdm import tqdm
+
+from snake.logic import game_seed
+from snake.results import ScoreStats, Z_95
+from snake.test import GamePool, GameTask
+
+
+class PairedStats:
+    """
+    Scores of two AIs over the same games, and the difference between them
+    game by game.
+    """
+
+    def __init__(self):
+        self.a = ScoreStats()
+        self.b = ScoreStats()
+        self.diff = ScoreStats()
+
+    def add(self, a, b):
+        self.a.add(a)
+        self.b.add(b)
+        self.diff.add(b - a)
+
+    # the standard error the difference would have from unpaired games
+    def unpaired_stderr(self):
+        return math.hypot(self.a.stderr(), self.b.stderr())
+
+
+# the tasks of both AIs for every game, each game's pair next to each other
+# so pairs finish close together
+def _tasks(a, b, n, difficulties, DIFFICULTIES, seed):
+    tasks = []
+    for diff in difficulties:
+        cfg = DIFFICULTIES[diff]
+        for game in range(n):
+            s = game_seed(seed, diff, game)
+            tasks += [GameTask(diff, game, cfg, s, player=p) for p in (a, b)]
+    return tasks
+
+
+def _print_row(name, a, b, diff, stderr, unpaired):
+    print(
+        f"  {name:<12}{a:>8.1f}{b:>8.1f}{diff:>+9.2f}{stderr:>8.2f}{unpaired:>11.2f}"
+    )
+
+
+# a and b are AIs as given to snake.test.load_ai, played on the same seeds
+def compare(
+    a,
+    b,
+    n,
+    difficulty,
+    DIFFICULTIES,
+    seed=None,
+    workers=1,
+):
+    """Compare two AIs on the same games"""
+    if seed is None:
+        seed = random.randrange(2**32)
+
+    difficulties = list(DIFFICULTIES) if difficulty == "all" else [difficulty]
+    tasks = _tasks(a, b, n, difficulties, DIFFICULTIES, seed)
+
+    print(f"\nComparing {a} (A) with {b} (B), {n} games each on the same seeds")
+    stats = {diff: PairedStats() for diff in difficulties}
+
+    # (difficulty, game) -> the result of the first AI to finish it
+    waiting = {}
+    with GamePool(workers) as pool:
+        with tqdm(total=len(tasks), desc="Comparing", unit="game") as pbar:
+            for result in pool.submit(tasks):
+                pbar.update(1)
+                first = waiting.pop((result.difficulty, result.game), None)
+                if first is None:
+                    waiting[result.difficulty, result.game] = result
+                    continue
+
+                if result.player == a:
+                    first, result = result, first
+                stats[result.difficulty].add(first.score, result.score)
+
+    print(f"\n  {'':<12}{'A':>8}{'B':>8}{'B - A':>9}{'SE':>8}{'unpaired':>11}")
+    for diff, s in stats.items():
+        _print_row(
+            diff,
+            s.a.mean(),
+            s.b.mean(),
+            s.diff.mean(),
+            s.diff.stderr(),
+            s.unpaired_stderr(),
+        )
+
+    # the final score is the average over difficulties, as in test_all
+    k = len(stats)
+    mean = sum(s.diff.mean() for s in stats.values()) / k
+    stderr = math.sqrt(sum(s.diff.stderr() ** 2 for s in stats.values())) / k
+    unpaired = math.sqrt(sum(s.unpaired_stderr() ** 2 for s in stats.values())) / k
+    if k > 1:
+        _print_row(
+            "average",
+            sum(s.a.mean() for s in stats.values()) / k,
+            sum(s.b.mean() for s in stats.values()) / k,
+            mean,
+            stderr,
+            unpaired,
+        )
+
+    if abs(mean) > Z_95 * stderr:
+        better = "B" if mean > 0 else "A"
+        print(f"\n  {better} scores higher, significant at 95%")
+    else:
+        print("\n  No significant difference at 95%")
+    return mean, stderr
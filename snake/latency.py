@@ -0,0 +1,83 @@
+import math
+
+# durations are bucketed from this many seconds up, each bucket 5% wider
+_MIN = 1e-7
+_GROWTH = 1.05
+_LOG_GROWTH = math.log(_GROWTH)
+
+
+class Latency:
+    """
+    Histogram of durations in seconds.
+
+    Buckets are log spaced, so percentiles come out within 5% whatever the
+    scale, and a histogram stays small however many durations it holds.
+    Histograms from different worker processes can be merged.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        b = int(math.log(seconds / _MIN) / _LOG_GROWTH) if seconds > _MIN else 0
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for b, n in other.buckets.items():
+            self.buckets[b] = self.buckets.get(b, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    # the duration p percent of durations are at or below, e.g. 95 for p95
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+
+        rank = p / 100 * self.count
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return min(_MIN * _GROWTH ** (b + 1), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class GameTimings:
+    """
+    How long the player's and enemies' AIs take per move, and how long the
+    engine takes per tick, across any number of games.
+    """
+
+    def __init__(self):
+        self.player = Latency()
+        self.enemy = Latency()
+        self.engine = Latency()
+
+    def merge(self, other):
+        self.player.merge(other.player)
+        self.enemy.merge(other.enemy)
+        self.engine.merge(other.engine)
+
+    def print_report(self):
+        columns = "".join(f"{c:>9}" for c in ("p50", "p95", "p99", "max"))
+        print(f"  {'Timing (ms):':<18}{columns}")
+        rows = [
+            ("player move", self.player),
+            ("enemy move", self.enemy),
+            ("engine tick", self.engine),
+        ]
+        for name, latency in rows:
+            if latency.count:
+                ms = [latency.percentile(p) * 1000 for p in (50, 95, 99)]
+                ms.append(latency.max * 1000)
+                print(f"    {name:<16}" + "".join(f"{t:>9.3f}" for t in ms))
@@ -1,7 +1,11 @@
 from dataclasses import dataclass
 from enum import Enum
 from collections import deque
+from collections.abc import Set
+import copy
+import hashlib
 import random
+import time
 
 
 # the possible moves for a snake
@@ -30,13 +34,20 @@ class Snake:
         self.direction = direction
         self.id = id
 
+        # the cells the body covers and how many segments are on each, kept
+        # in sync with the body
+        # only a snake chasing its own tail ever has two on one cell
+        self._covered = {(x, y)}
+        self._cells = {(x, y): 1}
+
     @property
     def head(self):
         return self.body[0]
 
+    # the cells the body covers, as a set of the caller's own
     @property
     def body_set(self):
-        return set(self.body)
+        return self._covered.copy()
 
     # gets the next position of the head if we took a given turn
     def get_next_head(self, turn):
@@ -45,14 +56,89 @@ class Snake:
         return (self.head[0] + dx, self.head[1] + dy)
 
     # moves the snake, growing if needed
+    # returns the cell the tail left, or None if the snake grew
     def move(self, turn, grow=False):
         self.direction = (self.direction + turn.value) % 4
         dx, dy = DIRECTIONS[self.direction]
         new_head = (self.head[0] + dx, self.head[1] + dy)
 
         self.body.appendleft(new_head)
+        self._add_cell(new_head)
         if not grow:
-            self.body.pop()
+            tail = self.body.pop()
+            self._remove_cell(tail)
+            return tail
+        return None
+
+    # takes back a move, given the cell the tail left
+    def unmove(self, tail):
+        self._remove_cell(self.body.popleft())
+        if tail is not None:
+            self.body.append(tail)
+            self._add_cell(tail)
+
+    def _add_cell(self, cell):
+        self._cells[cell] = self._cells.get(cell, 0) + 1
+        self._covered.add(cell)
+
+    def _remove_cell(self, cell):
+        count = self._cells[cell] - 1
+        if count:
+            self._cells[cell] = count
+        else:
+            del self._cells[cell]
+            self._covered.discard(cell)
+
+    # returns an independent copy of the snake
+    def copy(self):
+        snake = copy.copy(self)
+        snake.body = deque(self.body)
+        snake._covered = set(self._covered)
+        snake._cells = dict(self._cells)
+        return snake
+
+
+# the kinds of change a game reports to its subscribers, see SnakeGame.subscribe
+class EventKind(Enum):
+    # the board was cleared, the events that follow set it up again
+    RESET = 0
+    # the game jumped to another state through undo() or restore(), so
+    # anything mirroring it has to read it from the game again
+    SYNC = 1
+    SNAKE_ADDED = 2
+    HEAD_ADDED = 3
+    TAIL_REMOVED = 4
+    SNAKE_DIED = 5
+    FOOD_ADDED = 6
+    FOOD_EATEN = 7
+    WALL_ADDED = 8
+
+
+# a single change to a game, cell and snake_id are set where they apply
+@dataclass(frozen=True)
+class GameEvent:
+    kind: EventKind
+    cell: tuple = None
+    snake_id: int = None
+
+
+class EventLog:
+    """
+    Collects the events of a game so they can be taken a tick at a time.
+    """
+
+    def __init__(self, game):
+        self.events = []
+        game.subscribe(self._add)
+
+    def _add(self, event: GameEvent):
+        self.events.append(event)
+
+    # returns the events since the last call
+    def take(self):
+        events = self.events
+        self.events = []
+        return events
 
 
 # the state passed to the user for their AI
@@ -66,36 +152,410 @@ class GameState:
     walls: set
     score: int
 
+    # cell -> id of the snake covering it, see SnakeGame.owner_at
+    owners: dict = None
+
+    # time.perf_counter() time the move has to be made by, if it has a limit
+    deadline: float = None
+
+    # returns the id of the snake covering a cell, or None
+    def owner_at(self, cell):
+        return self.owners.get(cell)
+
+    # returns the seconds left to make the move, or None if there's no limit
+    def time_left(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.perf_counter()
+
+
+class CellPool(Set):
+    """
+    A set of cells that can also pick a uniformly random cell in O(1).
+
+    Cells are kept in a dense list with a cell -> index map. Removing a cell
+    moves the last cell into its slot, and add() can put a cell back into the
+    slot it was removed from, so a removal can be undone exactly. The order
+    of the list only depends on the order of the changes, never on hashing,
+    so the same seed always picks the same cells.
+
+    A copy is a layer over the pool it was copied from that only holds the
+    slots and cells changed since, so copying a pool and changing it costs
+    about as much as the changes. The pool copied from must not be changed
+    afterwards, which SnakeGame's copy on write makes sure of.
+    """
+
+    # layers a lookup may go through before a copy merges them
+    MAX_DEPTH = 8
+
+    def __init__(self, cells=()):
+        self._fill(cells)
+
+    def __contains__(self, cell):
+        if self._base is None:
+            return cell in self._index
+        return self._find(cell) is not None
+
+    def __iter__(self):
+        if self._base is None:
+            return iter(self._cells)
+        return (self._slot(i) for i in range(self._len))
+
+    def __len__(self):
+        return self._len
+
+    # lets random.choice() pick straight from the pool
+    def __getitem__(self, i):
+        if self._base is None:
+            return self._cells[i]
+        if not 0 <= i < self._len:
+            raise IndexError("CellPool index out of range")
+        return self._slot(i)
+
+    def __copy__(self):
+        pool = CellPool()
+        pool._base = self
+        pool._depth = self._depth + 1
+        pool._len = self._len
+        pool._slots = {}
+
+        # merges the layers into one over the bottom pool when there are
+        # too many to look through
+        if pool._depth > self.MAX_DEPTH:
+            layer = self
+            while layer._base is not None:
+                for i, cell in layer._slots.items():
+                    pool._slots.setdefault(i, cell)
+                for cell, i in layer._index.items():
+                    pool._index.setdefault(cell, i)
+                layer = layer._base
+            pool._base = layer
+            pool._depth = 1
+            pool._compact()
+        return pool
+
+    # adds a cell, at the given index if it is put back after remove()
+    # the cell in that slot moves to the end
+    def add(self, cell, index=None):
+        if cell in self:
+            return
+        end = self._len
+        if index is None or index >= end:
+            index = end
+            moved = None
+        else:
+            moved = self._slot(index)
+        self._len += 1
+
+        if self._base is None:
+            if moved is None:
+                self._cells.append(cell)
+            else:
+                self._cells.append(moved)
+                self._cells[index] = cell
+                self._index[moved] = end
+            self._index[cell] = index
+            return
+
+        if moved is not None:
+            self._write(end, moved)
+        self._write(index, cell)
+        self._compact()
+
+    # removes a cell and returns the index it was at
+    def remove(self, cell):
+        index = self._find(cell)
+        if index is None:
+            raise KeyError(cell)
+        self._len -= 1
+
+        if self._base is None:
+            del self._index[cell]
+            last = self._cells.pop()
+            if index < self._len:
+                self._cells[index] = last
+                self._index[last] = index
+            return index
+
+        last = self._slot(self._len)
+        self._slots.pop(self._len, None)
+        self._index[cell] = None
+        if index < self._len:
+            self._write(index, last)
+        self._compact()
+        return index
+
+    # makes the pool hold just the given cells, as a pool of its own
+    # in a layer _cells is unused, and _slots and _index map index -> cell
+    # and cell -> index for what changed since the base, a removed cell
+    # mapping to None
+    def _fill(self, cells):
+        self._base = None
+        self._depth = 0
+        self._cells = list(dict.fromkeys(cells))
+        self._len = len(self._cells)
+        self._index = dict(zip(self._cells, range(self._len)))
+        self._slots = None
+
+    # the cell at an index
+    def _slot(self, i):
+        layer = self
+        while layer._base is not None:
+            if i in layer._slots:
+                return layer._slots[i]
+            layer = layer._base
+        return layer._cells[i]
+
+    # the index of a cell, or None if it isn't in the pool
+    def _find(self, cell):
+        layer = self
+        while layer._base is not None:
+            if cell in layer._index:
+                return layer._index[cell]
+            layer = layer._base
+        return layer._index.get(cell)
+
+    def _write(self, i, cell):
+        self._slots[i] = cell
+        self._index[cell] = i
+
+    # turns a layer back into a pool of its own once it has changed about
+    # half its cells, so the copying is paid for by the changes
+    def _compact(self):
+        if len(self._index) > self._len // 2 + 16:
+            self._fill(list(self))
+
+
+# a group of walls connected in any of the 8 directions
+# clusters are keyed by their root, the wall that started them
+class WallCluster:
+    def __init__(self):
+        self.cells = []
+
+        # flags of the borders the cluster touches, see SnakeGame._border_flags
+        self.borders = 0
+
+        # border walls within 2 cells of the cluster
+        # may also hold walls that have since joined this cluster
+        self.near = set()
+
+        # cells whose buffer zone isn't in the invalid wall cache yet
+        self.unbuffered = []
+
+    def copy(self):
+        cluster = WallCluster()
+        cluster.cells = list(self.cells)
+        cluster.borders = self.borders
+        cluster.near = set(self.near)
+        cluster.unbuffered = list(self.unbuffered)
+        return cluster
+
+
+# derives the seed of one game from a master seed
+# games are seeded individually so the results don't depend on which worker
+# plays them or in what order
+def game_seed(seed, difficulty, i):
+    digest = hashlib.sha256(f"{seed}:{difficulty}:{i}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
 
 class SnakeGame:
-    def __init__(self, width=10, height=10, num_enemies=1, num_food=5, max_moves=1000):
+    # containers that clones share until one side changes them
+    _cow_attrs = (
+        "food",
+        "walls",
+        "_empty",
+        "invalid_wall_cache",
+        "_owners",
+        "_wall_candidates",
+        "_wall_roots",
+        "_wall_clusters",
+    )
+
+    # plain values saved before a recorded move, see move_snake()
+    _journal_attrs = ("moves", "game_over")
+
+    def __init__(
+        self,
+        width=10,
+        height=10,
+        num_enemies=1,
+        num_food=5,
+        max_moves=1000,
+        seed=None,
+    ):
         self.width = width
         self.height = height
         self.num_enemies = num_enemies
         self.num_food = num_food
         self.max_moves = max_moves
         self.moves = 0
+
+        # the game's own random numbers, so nothing else using random, like
+        # the AIs, can change how the game plays out
+        self.rng = random.Random(seed)
+
+        # callbacks given every change to the game, see subscribe()
+        self._subscribers = []
         self.reset()  # in case people dont!
 
     # resets all snake game state
-    def reset(self):
-        self.game_over = False
-        self.moves = 0
-        self.snakes = []
-        self.food = set()
-        self.walls = set()
+    # a seed restarts the random numbers, so the same seed plays the same game
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self._clear()
 
         for _ in range(self.num_food):
             self.spawn_food()
 
         for i in range(self.num_enemies + 1):
-            pos = random.choice(list(self.get_empty_cells()))
-            self.snakes.append(
-                Snake(pos[0], pos[1], id=i, direction=random.randint(0, 3))
+            pos = self._random_cell(self.get_empty_cells())
+            self._add_snake(
+                Snake(pos[0], pos[1], id=i, direction=self._random_direction())
             )
 
+    # builds a game from the state an AI was given, e.g. to simulate ahead
+    # the snakes are copied so the real game is never changed
+    @classmethod
+    def from_state(cls, state: GameState, max_moves=1000, seed=None):
+        game = cls.__new__(cls)
+        game._load_state(state, max_moves, seed)
+        return game
+
+    def _load_state(self, state: GameState, max_moves, seed=None):
+        self.width = state.width
+        self.height = state.height
+        self.num_enemies = len(state.enemies)
+        self.num_food = len(state.food)
+        self.max_moves = max_moves
+        self.rng = random.Random(seed)
+        self._subscribers = []
+        self._clear()
+
+        for pos in state.food:
+            self._add_food(pos)
+        for pos in state.walls:
+            self._add_wall(pos)
+        for snake in [state.snake] + state.enemies:
+            self._add_snake(snake.copy())
+
+    # empties the board
+    def _clear(self):
+        self.game_over = False
+        self.moves = 0
+        self.snakes = []
+        self.food = set()
+        self.walls = set()
         self.invalid_wall_cache = set()
 
+        # every cell not covered by a wall, food or a live snake
+        # kept up to date as things move rather than rebuilt per query
+        cells = [(x, y) for x in range(self.width) for y in range(self.height)]
+        self._empty = CellPool(cells)
+
+        # cell -> id of the snake covering it, for every snake a head can't
+        # move into, i.e. live snakes and the player even once it has died
+        self._owners = {}
+
+        # empty cells not in the invalid wall cache, where walls may spawn
+        self._wall_candidates = CellPool(cells)
+
+        # wall -> root of its cluster, and root -> WallCluster
+        self._wall_roots = {}
+        self._wall_clusters = {}
+
+        # roots of the clusters this game copied for itself, any others may
+        # be shared with a clone, see _own_cluster()
+        self._owned_clusters = set()
+
+        # containers and snake indices shared with a clone, see clone()
+        self._shared = set()
+        self._shared_snakes = set()
+
+        # undo entries of recorded moves, see move_snake()
+        self._journal = None
+        self._undo_stack = []
+
+        self._emit(EventKind.RESET)
+
+    # returns a copy of the game that can be played independently
+    # the copy shares the board with this game and each side only copies a
+    # container or snake the first time it changes it
+    # the CellPools of empty cells are copied as layers holding just the
+    # changes, the other containers grow with the snakes, food and walls
+    # rather than the board, so forking doesn't copy the whole board
+    def clone(self):
+        game = copy.copy(self)
+        game.snakes = list(self.snakes)
+        game.rng = copy.copy(self.rng)
+        self._shared = set(self._cow_attrs)
+        self._shared_snakes = set(range(len(self.snakes)))
+        game._shared = set(self._shared)
+        game._shared_snakes = set(self._shared_snakes)
+        self._owned_clusters = set()
+        game._owned_clusters = set()
+
+        # a clone can't undo moves made before it was created
+        game._journal = None
+        game._undo_stack = []
+
+        # nor does it tell this game's subscribers about its changes
+        game._subscribers = []
+        return game
+
+    # saves the game so it can be returned to with restore()
+    def snapshot(self):
+        return self.clone()
+
+    # returns the game to a snapshot, which can be restored again later
+    def restore(self, snapshot):
+        subscribers = self._subscribers
+        self.__dict__.update(snapshot.clone().__dict__)
+        self._subscribers = subscribers
+        self._emit(EventKind.SYNC)
+
+    # calls callback with a GameEvent for every change to the game, so
+    # renderers, recorders and AIs can keep their own copy of the board up to
+    # date in the time it takes to apply the changes
+    # events come in the order the changes happen, e.g. a snake eating gives
+    # HEAD_ADDED, FOOD_EATEN, then the FOOD_ADDED and WALL_ADDED of the spawns
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    # tells the subscribers about a change
+    def _emit(self, kind, cell=None, snake_id=None):
+        if self._subscribers:
+            event = GameEvent(kind, cell, snake_id)
+            for callback in self._subscribers:
+                callback(event)
+
+    # gets a container that is safe to change, copying it if it is shared
+    def _own(self, name):
+        if name in self._shared:
+            self._shared.discard(name)
+            setattr(self, name, copy.copy(getattr(self, name)))
+        return getattr(self, name)
+
+    # gets a snake that is safe to change, copying it if it is shared
+    def _own_snake(self, snake_idx):
+        if snake_idx in self._shared_snakes:
+            self._shared_snakes.discard(snake_idx)
+            self.snakes[snake_idx] = self.snakes[snake_idx].copy()
+        return self.snakes[snake_idx]
+
+    # gets a wall cluster that is safe to change, copying it if it may be
+    # shared, so a clone only copies the clusters it changes
+    def _own_cluster(self, root):
+        clusters = self._own("_wall_clusters")
+        if root not in self._owned_clusters:
+            self._owned_clusters.add(root)
+            clusters[root] = clusters[root].copy()
+        return clusters[root]
+
     # checks if the game is over
     def isGameOver(self):
         return self.game_over
@@ -112,12 +572,26 @@ class SnakeGame:
             food=self.food,
             walls=self.walls,
             score=self.snakes[snake_idx].score,
+            owners=self._owners,
         )
 
+    # returns the id of the snake covering a cell, or None
+    def owner_at(self, cell):
+        return self._owners.get(cell)
+
     # moves a given snake
-    def move_snake(self, snake_idx, turn):
-        moved = self._move_snake(self.snakes[snake_idx], turn)
-        self.snakes[snake_idx].isAlive = moved
+    # with record=True the move can be taken back with undo()
+    def move_snake(self, snake_idx, turn, record=False):
+        snake = self._own_snake(snake_idx)
+
+        if record:
+            saved = [getattr(self, name) for name in self._journal_attrs]
+            saved += [snake.direction, snake.score, snake.isAlive]
+            self._journal = [(self._restore_values, (snake_idx, saved))]
+
+        moved = self._move_snake(snake, turn)
+        if not moved:
+            self._kill_snake(snake)
 
         if snake_idx == 0:
             self.game_over = not moved
@@ -126,56 +600,48 @@ class SnakeGame:
             if self.moves >= self.max_moves:
                 self.game_over = True
 
-            return moved
-
-        if not moved:
-            for pos in list(self.snakes[snake_idx].body):
-                self.food.add(pos)
+        if record:
+            self._undo_stack.append(self._journal)
+            self._journal = None
 
         return moved
 
-    # returns true if move successful, false if game over
-    def _move_snake(self, snake: Snake, turn):
-        next_head = snake.get_next_head(turn)
-
-        if next_head in self.walls:
-            return False
+    # takes back the last recorded move, restoring the game exactly
+    # undoes the changes in reverse, so costs about as much as the move did
+    def undo(self):
+        for undo_change, args in reversed(self._undo_stack.pop()):
+            undo_change(*args)
+        self._emit(EventKind.SYNC)
 
-        if not (0 <= next_head[0] < self.width and 0 <= next_head[1] < self.height):
-            return False
+    def _restore_values(self, snake_idx, saved):
+        n = len(self._journal_attrs)
+        for name, value in zip(self._journal_attrs, saved):
+            setattr(self, name, value)
 
-        # checks if we would collide with self
-        # note that we disclude the tail as this will move
-        body_without_tail = list(snake.body)[:-1]
-        if next_head in body_without_tail:
-            return False
-
-        # checks collisions with all other snakes (both player and enemies)
-        all_other_bodies = set()
+        snake = self._own_snake(snake_idx)
+        snake.direction, snake.score, snake.isAlive = saved[n:]
 
-        # adds player snake if we're not moving the player
-        if snake is not self.snakes[0]:
-            all_other_bodies |= self.snakes[0].body_set
+    # saves how to take back a change if a move is being recorded
+    def _log(self, undo_change, *args):
+        if self._journal is not None:
+            self._journal.append((undo_change, args))
 
-        # adds all enemy snakes except the one we're moving
-        for other_snake in self.snakes[1:]:
-            if other_snake.isAlive:
-                if other_snake is snake:
-                    continue
-                all_other_bodies |= other_snake.body_set
+    # returns true if move successful, false if game over
+    def _move_snake(self, snake: Snake, turn):
+        next_head = snake.get_next_head(turn)
 
-        if next_head in all_other_bodies:
+        if self._is_blocked(snake, next_head):
             return False
 
         # checks if we're moving into an apple
         will_eat = next_head in self.food
 
         # moves the snake, telling it whether to grow or not
-        snake.move(turn, grow=will_eat)
+        self._advance_snake(snake, turn, will_eat)
 
         # spawns a new food and wall
         if will_eat:
-            self.food.remove(next_head)
+            self._eat_food(next_head)
             if len(self.food) < self.num_food:
                 self.spawn_food()
             snake.score += 1
@@ -184,11 +650,39 @@ class SnakeGame:
 
         return True
 
+    # checks if a snake's head can't move into the given cell
+    def _is_blocked(self, snake: Snake, cell):
+        if cell in self.walls:
+            return True
+
+        if not (0 <= cell[0] < self.width and 0 <= cell[1] < self.height):
+            return True
+
+        # checks collisions with all snakes, including ourselves
+        # note that we disclude our own tail as this will move
+        owner = self._owners.get(cell)
+        if owner is None:
+            return False
+        return owner != snake.id or cell != snake.body[-1]
+
+    # what stops a snake's head moving into a cell, one of "border", "wall",
+    # "self" or "snake", or None if nothing does
+    def blocked_by(self, snake: Snake, cell):
+        if not (0 <= cell[0] < self.width and 0 <= cell[1] < self.height):
+            return "border"
+        if cell in self.walls:
+            return "wall"
+
+        owner = self._owners.get(cell)
+        if owner is None or (owner == snake.id and cell == snake.body[-1]):
+            return None
+        return "self" if owner == snake.id else "snake"
+
     # spawns an apple at a random unoccupied cell
     def spawn_food(self):
         empty = self.get_empty_cells()
         if empty:
-            self.food.add(random.choice(list(empty)))
+            self._add_food(self._random_cell(empty))
 
     # spawns a wall at a random unoccupied cell
     # considers some simple rules to avoid blocking the grid
@@ -196,13 +690,27 @@ class SnakeGame:
         if len(self.walls) >= self.width * self.height * 0.25:
             return
 
-        candidates = self.get_empty_cells() - self.invalid_wall_cache
-        if not candidates:
+        if not self._wall_candidates:
             return
 
-        pos = random.choice(list(candidates))
-        self.walls.add(pos)
+        pos = self._random_cell(self._wall_candidates)
+
+        # the rules are checked as if the wall was already placed
+        walls = self._own("walls")
+        walls.add(pos)
+        valid = self._wall_allowed(pos)
+        walls.remove(pos)
 
+        if valid:
+            self._add_wall(pos)
+        else:
+            self._invalidate_wall(pos)
+
+    # checks a newly placed wall against the wall rules
+    # may add a buffer zone around border clusters to the invalid wall cache
+    # the clusters the wall would join are looked up in _wall_roots, so
+    # the cost depends on the walls around pos rather than the whole cluster
+    def _wall_allowed(self, pos):
         # helpers
         neighbors = lambda p: [(p[0] + d[0], p[1] + d[1]) for d in DIRECTIONS]
         in_bounds = lambda p: 0 <= p[0] < self.width and 0 <= p[1] < self.height
@@ -214,85 +722,298 @@ class SnakeGame:
                     1 for nn in neighbors(n) if nn in self.walls or not in_bounds(nn)
                 )
                 if wall_count >= 3:
-                    self.walls.remove(pos)
-                    self.invalid_wall_cache.add(pos)
-                    return
-
-        # finds connected wall cluster
-        cluster = {pos}
-        queue = deque([pos])
-        while queue:
-            p = queue.popleft()
-            for dx, dy in [
-                (0, 1),
-                (0, -1),
-                (1, 0),
-                (-1, 0),
-                (1, 1),
-                (1, -1),
-                (-1, 1),
-                (-1, -1),
-            ]:
-                np = (p[0] + dx, p[1] + dy)
-                if np in self.walls and np not in cluster:
-                    cluster.add(np)
-                    queue.append(np)
+                    return False
+
+        # the clusters the new wall connects, which together with it make up
+        # its cluster
+        roots = self._adjacent_clusters(pos)
+        parts = [self._wall_clusters[root] for root in roots]
 
         # checks border touches
-        borders = set()
-        for x, y in cluster:
-            if x == 0:
-                borders.add("L")
-            if x == self.width - 1:
-                borders.add("R")
-            if y == 0:
-                borders.add("T")
-            if y == self.height - 1:
-                borders.add("B")
+        borders = self._border_flags(pos)
+        for part in parts:
+            borders |= part.borders
 
         # invalid if touches 2+ borders
-        if len(borders) >= 2:
-            self.walls.remove(pos)
-            self.invalid_wall_cache.add(pos)
-            return
+        if bin(borders).count("1") >= 2:
+            return False
 
-        # adds buffer zone around border-touching clusters
         if borders:
-            for wx, wy in cluster:
-                for dx in range(-2, 3):
-                    for dy in range(-2, 3):
-                        if abs(dx) + abs(dy) <= 2:
-                            p = (wx + dx, wy + dy)
-                            if in_bounds(p) and p not in self.walls:
-                                self.invalid_wall_cache.add(p)
+            # adds buffer zone around border-touching clusters
+            # a cluster's buffer zone only needs adding once
+            for root, part in zip(roots, parts):
+                if part.unbuffered:
+                    for cell in part.unbuffered:
+                        self._add_buffer_zone(cell)
+                    self._set_cluster_field(root, "unbuffered", [])
+            self._add_buffer_zone(pos)
 
             # checks for nearby border walls not in cluster
-            for wx, wy in cluster:
-                for dx in range(-2, 3):
-                    for dy in range(-2, 3):
-                        if dx == dy == 0:
-                            continue
-                        p = (wx + dx, wy + dy)
-                        if p in self.walls and p not in cluster:
-                            if p[0] in [0, self.width - 1] or p[1] in [
-                                0,
-                                self.height - 1,
-                            ]:
-                                self.walls.remove(pos)
-                                self.invalid_wall_cache.add(pos)
-                                return
+            near = self._border_walls_near(pos)
+            for part in parts:
+                near |= part.near
+            for p in near:
+                if p != pos and self._wall_roots[p] not in roots:
+                    return False
 
         # checks if wall has 3+ neighbors
         if len(self.walls) > 4:
             if sum(1 for n in neighbors(pos) if n in self.walls) >= 3:
-                self.walls.remove(pos)
-                self.invalid_wall_cache.add(pos)
+                return False
 
-    # gets all the empty cells in the grid
+        return True
+
+    # the roots of the distinct clusters of the walls around a cell
+    def _adjacent_clusters(self, pos):
+        roots = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                root = self._wall_roots.get((pos[0] + dx, pos[1] + dy))
+                if root is not None and root not in roots:
+                    roots.append(root)
+        return roots
+
+    # the borders a cell is on, as flags for left, right, top and bottom
+    def _border_flags(self, pos):
+        x, y = pos
+        return (
+            (x == 0)
+            | (x == self.width - 1) << 1
+            | (y == 0) << 2
+            | (y == self.height - 1) << 3
+        )
+
+    # walls, other than pos, within 2 cells in any direction of pos
+    def _walls_near(self, pos):
+        return {
+            (pos[0] + dx, pos[1] + dy)
+            for dx in range(-2, 3)
+            for dy in range(-2, 3)
+            if (dx or dy) and (pos[0] + dx, pos[1] + dy) in self.walls
+        }
+
+    # border walls, other than pos, within 2 cells in any direction of pos
+    def _border_walls_near(self, pos):
+        return {p for p in self._walls_near(pos) if self._border_flags(p)}
+
+    # adds the cells around a wall to the invalid wall cache
+    def _add_buffer_zone(self, pos):
+        wx, wy = pos
+        for dx in range(-2, 3):
+            for dy in range(-2, 3):
+                if abs(dx) + abs(dy) <= 2:
+                    p = (wx + dx, wy + dy)
+                    if (
+                        0 <= p[0] < self.width
+                        and 0 <= p[1] < self.height
+                        and p not in self.walls
+                    ):
+                        self._invalidate_wall(p)
+
+    # picks a random cell out of a CellPool
+    def _random_cell(self, cells):
+        self._log_rng()
+        return self.rng.choice(cells)
+
+    # picks a random direction for a newly spawned snake
+    def _random_direction(self):
+        self._log_rng()
+        return self.rng.randint(0, 3)
+
+    # saves the random number state before a draw in a recorded move
+    def _log_rng(self):
+        if self._journal is not None:
+            self._log(self.rng.setstate, self.rng.getstate())
+
+    # gets all the empty cells in the grid, as a CellPool
+    # note this is the live set maintained by the game, so don't modify it
     def get_empty_cells(self):
-        all_cells = {(x, y) for x in range(self.width) for y in range(self.height)}
-        occupied = self.walls | self.food
-        for s in self.snakes:
-            if s.isAlive:
-                occupied |= s.body_set
-        return all_cells - occupied
+        return self._empty
+
+    # the methods below are the only places game state is changed, and so
+    # where the events subscribers are given come from
+
+    # mutable containers are fetched with _own() so clones stay independent
+    # and changes are logged with _log() so recorded moves can be undone
+
+    def _add_to(self, name, item):
+        items = self._own(name)
+        if item not in items:
+            items.add(item)
+            self._log(self._discard_from, name, item)
+
+    def _discard_from(self, name, item):
+        items = self._own(name)
+        if item in items:
+            items.discard(item)
+            self._log(self._add_to, name, item)
+
+    def _set_item(self, name, key, value):
+        items = self._own(name)
+        if key in items:
+            self._log(self._set_item, name, key, items[key])
+        else:
+            self._log(self._del_item, name, key)
+        items[key] = value
+
+    def _del_item(self, name, key):
+        items = self._own(name)
+        self._log(self._set_item, name, key, items.pop(key))
+
+    # cells are put back in the slot they were removed from when undoing,
+    # so the pool's order, and with it the random picks, are restored too
+    def _add_to_pool(self, name, cell, index=None):
+        pool = self._own(name)
+        if cell not in pool:
+            pool.add(cell, index)
+            self._log(self._remove_from_pool, name, cell)
+
+    def _remove_from_pool(self, name, cell):
+        pool = self._own(name)
+        if cell in pool:
+            self._log(self._add_to_pool, name, cell, pool.remove(cell))
+
+    # wall clusters are only changed through these, on the game's own copy
+    # of the cluster, and only what changed is saved for undo
+    def _set_cluster_field(self, root, name, value):
+        cluster = self._own_cluster(root)
+        self._log(self._set_cluster_field, root, name, getattr(cluster, name))
+        setattr(cluster, name, value)
+
+    # adds walls to a cluster, with the borders, nearby border walls and
+    # unbuffered cells they bring
+    def _grow_cluster(self, root, cells, borders, near, unbuffered):
+        cluster = self._own_cluster(root)
+        near = near - cluster.near
+        self._log(
+            self._shrink_cluster,
+            root,
+            len(cluster.cells),
+            cluster.borders,
+            near,
+            len(cluster.unbuffered),
+        )
+        cluster.cells += cells
+        cluster.borders |= borders
+        cluster.near |= near
+        cluster.unbuffered += unbuffered
+
+    # takes back _grow_cluster(), given the sizes and borders from before it
+    # and the nearby border walls it added
+    def _shrink_cluster(self, root, size, borders, near, unbuffered):
+        cluster = self._own_cluster(root)
+        del cluster.cells[size:]
+        cluster.borders = borders
+        cluster.near -= near
+        del cluster.unbuffered[unbuffered:]
+
+    # an empty cell became occupied
+    def _occupy(self, pos):
+        self._remove_from_pool("_empty", pos)
+        self._remove_from_pool("_wall_candidates", pos)
+
+    # an occupied cell became empty
+    def _vacate(self, pos):
+        self._add_to_pool("_empty", pos)
+        if pos not in self.invalid_wall_cache:
+            self._add_to_pool("_wall_candidates", pos)
+
+    # stops walls spawning on a cell
+    def _invalidate_wall(self, pos):
+        self._add_to("invalid_wall_cache", pos)
+        self._remove_from_pool("_wall_candidates", pos)
+
+    # places a snake on the board
+    def _add_snake(self, snake: Snake):
+        self.snakes.append(snake)
+        for pos in snake.body:
+            self._occupy(pos)
+            self._set_item("_owners", pos, snake.id)
+        self._emit(EventKind.SNAKE_ADDED, snake.head, snake.id)
+
+    # moves a snake one step, growing it if it ate
+    def _advance_snake(self, snake: Snake, turn, grow):
+        tail = snake.move(turn, grow=grow)
+        if self._journal is not None:
+            self._log(self._retreat_snake, self.snakes.index(snake), tail)
+
+        self._occupy(snake.head)
+        if tail is not None and tail != snake.head:
+            self._vacate(tail)
+            self._del_item("_owners", tail)
+        self._set_item("_owners", snake.head, snake.id)
+
+        self._emit(EventKind.HEAD_ADDED, snake.head, snake.id)
+        if tail is not None:
+            self._emit(EventKind.TAIL_REMOVED, tail, snake.id)
+
+    # takes back a snake's step, putting back the tail it left
+    def _retreat_snake(self, snake_idx, tail):
+        self._own_snake(snake_idx).unmove(tail)
+
+    # kills a snake, dead enemies turn into food
+    def _kill_snake(self, snake: Snake):
+        snake.isAlive = False
+        self._emit(EventKind.SNAKE_DIED, snake.head, snake.id)
+
+        # the player's body is no longer occupied once it dies
+        if snake is self.snakes[0]:
+            for pos in snake.body:
+                if pos not in self.food:
+                    self._vacate(pos)
+            return
+
+        # a dead enemy's cells stay occupied, now by food
+        for pos in list(snake.body):
+            if pos not in self.food:
+                self._add_to("food", pos)
+                self._emit(EventKind.FOOD_ADDED, pos)
+            self._del_item("_owners", pos)
+
+    def _add_food(self, pos):
+        self._add_to("food", pos)
+        self._occupy(pos)
+        self._emit(EventKind.FOOD_ADDED, pos)
+
+    # removes an eaten apple, the cell is now under a snake's head
+    def _eat_food(self, pos):
+        self._discard_from("food", pos)
+        self._emit(EventKind.FOOD_EATEN, pos)
+
+    def _add_wall(self, pos):
+        self._add_to("walls", pos)
+        self._occupy(pos)
+        self._emit(EventKind.WALL_ADDED, pos)
+
+        # merges the clusters the wall connects into the largest one
+        clusters = self._wall_clusters
+        roots = self._adjacent_clusters(pos)
+        roots.sort(key=lambda root: len(clusters[root].cells), reverse=True)
+        if roots:
+            root = roots[0]
+        else:
+            root = pos
+            self._set_item("_wall_clusters", root, WallCluster())
+            self._owned_clusters.add(root)
+
+        parts = [self._wall_clusters[other] for other in roots[1:]]
+        cells = [cell for part in parts for cell in part.cells] + [pos]
+        borders = self._border_flags(pos)
+        near = self._border_walls_near(pos)
+        unbuffered = []
+        for part in parts:
+            borders |= part.borders
+            near |= part.near
+            unbuffered += part.unbuffered
+        unbuffered.append(pos)
+
+        for other in roots[1:]:
+            self._del_item("_wall_clusters", other)
+        for cell in cells:
+            self._set_item("_wall_roots", cell, root)
+        self._grow_cluster(root, cells, borders, near, unbuffered)
+
+        # a new border wall is near the clusters around it
+        if self._border_flags(pos):
+            for other in {self._wall_roots[p] for p in self._walls_near(pos)}:
+                self._grow_cluster(other, [], 0, {pos}, [])
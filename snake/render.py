@@ -1,11 +1,76 @@
+import time
+
 import pyray as rl
 from snake.logic import GameState
 from collections import deque
-import copy
+from dataclasses import dataclass
+
+# what push() does when the buffer is full, see SnakeRenderer
+BUFFER_POLICIES = ("block", "drop", "fast_forward")
+
+
+@dataclass(frozen=True)
+class SnakeFrame:
+    """Immutable copy of the parts of a Snake the renderer draws"""
+
+    id: int
+    body: tuple
+    direction: int
+    isAlive: bool
+    score: int
+
+
+@dataclass(frozen=True)
+class Frame:
+    """
+    Immutable copy of the parts of a GameState the renderer draws.
+
+    Food and walls are frozensets, shared with the previous frame while they
+    are unchanged, so a buffered frame costs little more than its bodies.
+    """
+
+    width: int
+    height: int
+    snake: SnakeFrame
+    enemies: tuple
+    food: frozenset
+    walls: frozenset
+
+
+def make_frame(state, prev=None):
+    """
+    Create an immutable frame of a game state.
+
+    Args:
+        state: GameState to copy
+        prev: The previous frame, whose food and walls are reused if unchanged
+    """
+    snake_frame = lambda s: SnakeFrame(
+        s.id, tuple(s.body), s.direction, s.isAlive, s.score
+    )
+
+    food = prev.food if prev and prev.food == state.food else state.food
+    walls = prev.walls if prev and prev.walls == state.walls else state.walls
+
+    return Frame(
+        width=state.width,
+        height=state.height,
+        snake=snake_frame(state.snake),
+        enemies=tuple(snake_frame(e) for e in state.enemies),
+        food=frozenset(food),
+        walls=frozenset(walls),
+    )
 
 
 class SnakeRenderer:
-    def __init__(self, cell_size=40, render_fps=60, moves_per_second=10):
+    def __init__(
+        self,
+        cell_size=40,
+        render_fps=60,
+        moves_per_second=10,
+        max_buffer=None,
+        buffer_policy="block",
+    ):
         """
         Initialize the raylib renderer for Snake game with Google Snake theme and buffered smooth movement.
 
@@ -13,6 +78,11 @@ class SnakeRenderer:
             cell_size: Size of each grid cell in pixels
             render_fps: Target render frames per second
             moves_per_second: How many game moves to play per second
+            max_buffer: Most frames to buffer, defaults to a second of moves
+            buffer_policy: What push() does when the buffer is full:
+                "block" keeps rendering until a frame is free, holding up the game,
+                "drop" skips the oldest buffered frame,
+                "fast_forward" plays faster the fuller the buffer is, then drops
         """
         self.cell_size = cell_size
         self.render_fps = render_fps
@@ -22,7 +92,12 @@ class SnakeRenderer:
         self.window_initialized = False
 
         # State buffer for smooth playback
+        if buffer_policy not in BUFFER_POLICIES:
+            raise ValueError(f"buffer_policy must be one of {BUFFER_POLICIES}")
+        self.max_buffer = max_buffer or max(1, moves_per_second)
+        self.buffer_policy = buffer_policy
         self.state_buffer = deque()
+        self.last_frame = None
         self.current_state = None
         self.next_state = None
         self.interpolation_progress = 0.0
@@ -34,6 +109,20 @@ class SnakeRenderer:
         # Restart handling
         self.restart_requested = False
 
+        # Text shown under the score, e.g. while the AI is thinking
+        self.status = None
+
+        # Cached textures, made once the window is open
+        # the board layer holds the frame, board, walls and food
+        self.board_layer = None
+        self.layer_food = None
+        self.layer_walls = None
+        self.segment_stamps = None
+
+        # Smoothed frame timings shown in the corner
+        self.draw_ms = 0.0
+        self.interp_ms = 0.0
+
         # Google Snake theme colors
         self.BG_BOARD = rl.Color(170, 215, 81, 255)  # Light green board
         self.BG_FRAME = rl.Color(87, 138, 52, 255)  # Dark green frame
@@ -69,14 +158,26 @@ class SnakeRenderer:
 
         Args:
             state: GameState object containing snake, food, walls, etc.
+                or a Frame made with make_frame()
         """
         # Initialize window on first render
         if not self.window_initialized:
             self._init_window(state.width, state.height)
 
-        # Add state to buffer (make a copy to avoid reference issues)
-        state_copy = self._copy_state(state)
-        self.state_buffer.append(state_copy)
+        # Make room in the buffer according to the policy
+        while len(self.state_buffer) >= self.max_buffer:
+            if self.buffer_policy == "block" and self.window_initialized:
+                if rl.window_should_close():
+                    return
+                self._process_and_render()
+            else:
+                self.state_buffer.popleft()
+
+        # Add state to buffer (as a frame, as the game changes the state)
+        if not isinstance(state, Frame):
+            state = make_frame(state, self.last_frame)
+        self.last_frame = state
+        self.state_buffer.append(state)
 
         # Initialize current state if needed
         if self.current_state is None:
@@ -116,6 +217,7 @@ class SnakeRenderer:
     def reset(self):
         """Clear the state buffer and reset to current state"""
         self.state_buffer.clear()
+        self.last_frame = None
         self.next_state = None
         self.interpolation_progress = 0.0
         self.prev_enemy_bodies = {}  # Clear the enemy body cache
@@ -127,9 +229,13 @@ class SnakeRenderer:
             return True
         return not rl.window_should_close()
 
-    def _copy_state(self, state):
-        """Create a deep copy of the game state"""
-        return copy.deepcopy(state)
+    def is_buffer_full(self):
+        """Check if a push would have to block or drop a frame"""
+        return len(self.state_buffer) >= self.max_buffer
+
+    def is_buffer_empty(self):
+        """Check if there is nothing left to play after the current move"""
+        return not self.state_buffer and self.next_state is None
 
     def _process_and_render(self):
         """Process buffer and render the current interpolated frame"""
@@ -145,9 +251,12 @@ class SnakeRenderer:
         # Get delta time
         dt = rl.get_frame_time()
 
-        # Advance interpolation
+        # Advance interpolation, faster the fuller the buffer when fast forwarding
         if self.next_state is not None:
-            self.interpolation_progress += dt / self.move_duration
+            speed = 1.0
+            if self.buffer_policy == "fast_forward":
+                speed += 3.0 * len(self.state_buffer) / self.max_buffer
+            self.interpolation_progress += speed * dt / self.move_duration
 
             # If we've completed the interpolation, move to next state
             if self.interpolation_progress >= 1.0:
@@ -183,8 +292,63 @@ class SnakeRenderer:
         if state is None:
             return
 
+        start = time.perf_counter()
+
+        # Redraw the board layer only when the food or walls change
+        if self.board_layer is None or not (
+            self.layer_food is state.food and self.layer_walls is state.walls
+        ):
+            self._draw_board_layer(state)
+        if self.segment_stamps is None:
+            self.segment_stamps = (self._make_stamp(0.3), self._make_stamp(0.4))
+
+        # Interpolate every snake before drawing any of them
+        interp_start = time.perf_counter()
+        snakes = self._snake_positions(alpha)
+        interp_end = time.perf_counter()
+
         rl.begin_drawing()
 
+        # Frame, board, checkerboard, walls and food in one texture draw
+        # (render textures are stored upside down, hence the negative height)
+        texture = self.board_layer.texture
+        rl.draw_texture_rec(
+            texture,
+            rl.Rectangle(0, 0, texture.width, -texture.height),
+            rl.Vector2(0, 0),
+            self.WHITE,
+        )
+
+        # Draw enemy snakes first (so player snake appears on top)
+        self._draw_snakes(snakes)
+
+        # UI elements (Google Snake style)
+        self._draw_ui(state)
+
+        # Game over overlay
+        if not state.snake.isAlive:
+            self._draw_game_over(state)
+
+        # Frame time of the previous frame, as this one isn't finished yet
+        self._draw_stats()
+
+        # Smooths the timings so they can be read
+        interp = interp_end - interp_start
+        draw = time.perf_counter() - start - interp
+        self.interp_ms += 0.1 * (interp * 1000 - self.interp_ms)
+        self.draw_ms += 0.1 * (draw * 1000 - self.draw_ms)
+
+        rl.end_drawing()
+
+    def _draw_board_layer(self, state):
+        """Draw the parts that only change with food and walls into the board layer"""
+        if self.board_layer is None:
+            self.board_layer = rl.load_render_texture(
+                self.window_width, self.window_height
+            )
+
+        rl.begin_texture_mode(self.board_layer)
+
         # Dark green frame background
         rl.clear_background(self.BG_FRAME)
 
@@ -217,177 +381,143 @@ class SnakeRenderer:
         for fx, fy in state.food:
             self._draw_apple(fx, fy)
 
-        # Draw enemy snakes first (so player snake appears on top)
-        self._draw_enemy_snakes_smooth(alpha)
+        rl.end_texture_mode()
+        self.layer_food = state.food
+        self.layer_walls = state.walls
 
-        # Draw player snake
-        self._draw_player_snake_smooth(alpha)
+    def _snake_positions(self, alpha):
+        """
+        Work out where to draw every snake this frame.
 
-        # UI elements (Google Snake style)
-        self._draw_ui(state)
+        Returns (positions, direction, color) per snake in drawing order, enemies
+        first, with positions running head to tail and interpolated by alpha.
+        """
+        if self.current_state is None:
+            return []
 
-        # Game over overlay
-        if not state.snake.isAlive:
-            self._draw_game_over(state)
+        snakes = []
+        next_state = self.next_state
 
-        # Buffer indicator (optional debug info)
-        # buffer_text = f"Buffer: {len(self.state_buffer)}"
-        # rl.draw_text(buffer_text, self.window_width - 150, self.window_height - 30, 16,
-        #            rl.Color(255, 255, 255, 150))
+        # Build a map of next state enemies by ID for easy lookup
+        next_enemies_by_id = {}
+        if next_state is not None:
+            for enemy in next_state.enemies:
+                if enemy is not None and enemy.isAlive:
+                    next_enemies_by_id[enemy.id] = enemy
 
-        rl.end_drawing()
+        for curr_enemy in self.current_state.enemies:
+            # Skip None, empty or already dead enemies
+            if curr_enemy is None or not curr_enemy.body or not curr_enemy.isAlive:
+                continue
 
-    def _draw_player_snake_smooth(self, alpha):
-        """Draw player snake with smooth interpolation between current and next state"""
-        if self.current_state is None or not self.current_state.snake.body:
-            return
+            if next_state is None:
+                # No next state - just draw current state
+                snakes.append(
+                    (curr_enemy.body, curr_enemy.direction, self.ENEMY_COLOR)
+                )
+            elif curr_enemy.id in next_enemies_by_id:
+                # Snake survives - interpolate normally
+                next_enemy = next_enemies_by_id[curr_enemy.id]
+                prev_body = self.prev_enemy_bodies.get(curr_enemy.id, curr_enemy.body)
+                snakes.append(
+                    (
+                        self._interpolate(prev_body, next_enemy.body, alpha),
+                        next_enemy.direction,
+                        self.ENEMY_COLOR,
+                    )
+                )
+            else:
+                # Snake dies in next frame - fade out to 30% opacity
+                fade_color = rl.Color(
+                    self.ENEMY_COLOR.r,
+                    self.ENEMY_COLOR.g,
+                    self.ENEMY_COLOR.b,
+                    int(255 * (1.0 - alpha * 0.7)),
+                )
+                snakes.append((curr_enemy.body, curr_enemy.direction, fade_color))
 
         # Always draw player snake even if dead (for game over screen)
-        curr_body = list(self.current_state.snake.body)
-
-        # If we have a next state, interpolate towards it
-        if self.next_state is not None and self.next_state.snake.body:
-            prev_body = (
-                list(self.prev_player_body) if self.prev_player_body else curr_body
-            )
-            next_body = list(self.next_state.snake.body)
+        player = self.current_state.snake
+        if not player.body:
+            return snakes
+
+        if next_state is not None and next_state.snake.body:
+            prev_body = self.prev_player_body or player.body
+            positions = self._interpolate(prev_body, next_state.snake.body, alpha)
+            snakes.append((positions, next_state.snake.direction, self.SNAKE_COLOR))
+        else:
+            snakes.append((player.body, player.direction, self.SNAKE_COLOR))
 
-            # Ensure bodies match length
-            while len(prev_body) < len(next_body):
-                prev_body.append(prev_body[-1] if prev_body else next_body[0])
-            while len(prev_body) > len(next_body):
-                prev_body.pop()
+        return snakes
 
-            # Draw segments with interpolation
-            for i in range(len(next_body) - 1, -1, -1):
-                is_head = i == 0
-                is_tail = i == len(next_body) - 1
+    def _interpolate(self, prev_body, next_body, alpha):
+        """Interpolate each segment from prev_body towards next_body"""
+        # Ensure bodies match length
+        prev_body = list(prev_body)
+        while len(prev_body) < len(next_body):
+            prev_body.append(prev_body[-1] if prev_body else next_body[0])
+        del prev_body[len(next_body) :]
 
-                # Interpolate between prev and next position
-                prev_x, prev_y = prev_body[i]
-                next_x, next_y = next_body[i]
+        return [
+            (prev_x + (next_x - prev_x) * alpha, prev_y + (next_y - prev_y) * alpha)
+            for (prev_x, prev_y), (next_x, next_y) in zip(prev_body, next_body)
+        ]
 
-                interp_x = prev_x + (next_x - prev_x) * alpha
-                interp_y = prev_y + (next_y - prev_y) * alpha
+    def _draw_snakes(self, snakes):
+        """
+        Draw snakes from _snake_positions.
 
-                direction = self.next_state.snake.direction if is_head else None
-                self._draw_segment_smooth(
-                    interp_x, interp_y, is_head, direction, is_tail, self.SNAKE_COLOR
-                )
-        else:
-            # No next state, just draw current state
-            direction = self.current_state.snake.direction
-            for i in range(len(curr_body) - 1, -1, -1):
-                is_head = i == 0
-                is_tail = i == len(curr_body) - 1
-                x, y = curr_body[i]
-                self._draw_segment_smooth(
-                    float(x),
-                    float(y),
-                    is_head,
-                    direction if is_head else None,
-                    is_tail,
-                    self.SNAKE_COLOR,
+        Body segments are stamped from one cached texture per shape, tinted with
+        the snake's color, so raylib sends them in a few draw calls rather than
+        building each rounded rectangle. Heads are drawn on top afterwards.
+        """
+        body = self.segment_stamps[0].texture
+        tail = self.segment_stamps[1].texture
+
+        cell = self.cell_size
+        offset = self.padding + (cell - body.width) // 2
+
+        # Bodies are drawn from tail to head, enemies first
+        for positions, direction, color in snakes:
+            last = len(positions) - 1
+            for i in range(last, 0, -1):
+                x, y = positions[i]
+                rl.draw_texture(
+                    tail if i == last else body,
+                    int(offset + x * cell),
+                    int(offset + y * cell),
+                    color,
                 )
 
-    def _draw_enemy_snakes_smooth(self, alpha):
-        """Draw all enemy snakes with smooth interpolation using ID-based matching"""
-        if self.current_state is None:
-            return
+        for positions, direction, color in snakes:
+            x, y = positions[0]
+            self._draw_segment_smooth(x, y, True, direction, False, color)
 
-        # Build a map of next state enemies by ID for easy lookup
-        next_enemies_by_id = {}
-        if self.next_state is not None:
-            for enemy in self.next_state.enemies:
-                if enemy is not None and enemy.isAlive:
-                    next_enemies_by_id[enemy.id] = enemy
-
-        for curr_enemy in self.current_state.enemies:
-            # Skip None or empty enemies
-            if curr_enemy is None or not curr_enemy.body:
-                continue
-
-            # Skip already dead enemies
-            if not curr_enemy.isAlive:
-                continue
-
-            curr_body = list(curr_enemy.body)
-            snake_id = curr_enemy.id
-
-            # Check if this snake exists in next state
-            if self.next_state is not None:
-                if snake_id in next_enemies_by_id:
-                    # Snake survives - interpolate normally
-                    next_enemy = next_enemies_by_id[snake_id]
-
-                    # Get previous body for this snake ID
-                    prev_body = list(self.prev_enemy_bodies.get(snake_id, curr_body))
-                    next_body = list(next_enemy.body)
-
-                    # Ensure bodies match length
-                    while len(prev_body) < len(next_body):
-                        prev_body.append(prev_body[-1] if prev_body else next_body[0])
-                    while len(prev_body) > len(next_body):
-                        prev_body.pop()
-
-                    # Draw segments with interpolation
-                    for i in range(len(next_body) - 1, -1, -1):
-                        is_head = i == 0
-                        is_tail = i == len(next_body) - 1
-
-                        prev_x, prev_y = prev_body[i]
-                        next_x, next_y = next_body[i]
-
-                        interp_x = prev_x + (next_x - prev_x) * alpha
-                        interp_y = prev_y + (next_y - prev_y) * alpha
-
-                        direction = next_enemy.direction if is_head else None
-                        self._draw_segment_smooth(
-                            interp_x,
-                            interp_y,
-                            is_head,
-                            direction,
-                            is_tail,
-                            self.ENEMY_COLOR,
-                        )
-                else:
-                    # Snake dies in next frame - fade out effect
-                    fade_alpha = int(255 * (1.0 - alpha * 0.7))  # Fade to 30% opacity
-                    fade_color = rl.Color(
-                        self.ENEMY_COLOR.r,
-                        self.ENEMY_COLOR.g,
-                        self.ENEMY_COLOR.b,
-                        fade_alpha,
-                    )
-
-                    direction = curr_enemy.direction
-                    for i in range(len(curr_body) - 1, -1, -1):
-                        is_head = i == 0
-                        is_tail = i == len(curr_body) - 1
-                        x, y = curr_body[i]
-                        self._draw_segment_smooth(
-                            float(x),
-                            float(y),
-                            is_head,
-                            direction if is_head else None,
-                            is_tail,
-                            fade_color,
-                        )
-            else:
-                # No next state - just draw current state
-                direction = curr_enemy.direction
-                for i in range(len(curr_body) - 1, -1, -1):
-                    is_head = i == 0
-                    is_tail = i == len(curr_body) - 1
-                    x, y = curr_body[i]
-                    self._draw_segment_smooth(
-                        float(x),
-                        float(y),
-                        is_head,
-                        direction if is_head else None,
-                        is_tail,
-                        self.ENEMY_COLOR,
-                    )
+    def _make_stamp(self, roundness):
+        """Draw a white snake segment into a texture, to tint when drawn"""
+        size = self.cell_size - 8
+        stamp = rl.load_render_texture(size, size)
+        rl.begin_texture_mode(stamp)
+        rl.clear_background(rl.Color(0, 0, 0, 0))
+        rl.draw_rectangle_rounded(
+            rl.Rectangle(0, 0, size, size), roundness, 8, self.WHITE
+        )
+        rl.end_texture_mode()
+        return stamp
+
+    def _draw_stats(self):
+        """Draw the render timings in the bottom corner"""
+        text = (
+            f"draw {self.draw_ms:.1f}ms  interp {self.interp_ms:.1f}ms  "
+            f"{rl.get_fps()} fps"
+        )
+        rl.draw_text(
+            text,
+            self.window_width - rl.measure_text(text, 14) - 10,
+            self.window_height - 18,
+            14,
+            rl.Color(255, 255, 255, 150),
+        )
 
     def _draw_segment_smooth(self, x, y, is_head, direction, is_tail, color):
         """Draw a snake segment at interpolated position (x, y can be floats)"""
@@ -463,6 +593,9 @@ class SnakeRenderer:
         rl.draw_rectangle(38, 22, 3, 6, rl.Color(139, 69, 19, 255))  # stem
         rl.draw_text(f"{state.snake.score}", 60, 25, 28, self.WHITE)
 
+        if self.status:
+            rl.draw_text(self.status, 25, 55, 18, rl.Color(255, 255, 255, 200))
+
     def _draw_game_over(self, state):
         """Draw game over overlay"""
         # Semi-transparent overlay
@@ -517,6 +650,12 @@ class SnakeRenderer:
     def close(self):
         """Close the raylib window"""
         if self.window_initialized:
+            if self.board_layer is not None:
+                rl.unload_render_texture(self.board_layer)
+            for stamp in self.segment_stamps or ():
+                rl.unload_render_texture(stamp)
+            self.board_layer = None
+            self.segment_stamps = None
             rl.close_window()
             self.window_initialized = False
 
@@ -0,0 +1,170 @@
+import struct
+
+from snake.logic import SnakeGame, Turn
+
+# a replay file is the magic and version, then one record per game:
+#   header   width, height, num_enemies, num_food, max_moves as u16,
+#            the game's seed as u64 and the number of turns as u32
+#   turns    2 bits per turn, 4 turns to a byte, lowest bits first
+# all little endian
+#
+# a turn is stored for every snake move, in the order the game loop makes
+# them. dead snakes don't move, and as the replay knows which snakes are
+# alive it needs no tick or snake markers
+MAGIC = b"SNKR"
+VERSION = 1
+_HEADER = struct.Struct("<5HQI")
+
+# the config values that decide how a game plays out
+CONFIG_KEYS = ("width", "height", "num_enemies", "num_food", "max_moves")
+
+
+class GameRecord:
+    """
+    The config, seed and turns of one game, which is all it takes to play it
+    again exactly.
+    """
+
+    def __init__(self, cfg, seed, turns=b"", count=0):
+        self.cfg = {key: cfg[key] for key in CONFIG_KEYS}
+        self.seed = seed
+        self._turns = bytearray(turns)
+        self._count = count
+
+    # number of turns recorded
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError("turn index out of range")
+        return Turn((self._turns[i >> 2] >> ((i & 3) * 2) & 3) - 1)
+
+    # records the next snake move
+    def add(self, turn):
+        i = self._count
+        if i & 3 == 0:
+            self._turns.append(0)
+        self._turns[-1] |= (turn.value + 1) << ((i & 3) * 2)
+        self._count += 1
+
+    # a new game in the state the recorded game started in
+    def new_game(self):
+        return SnakeGame(**self.cfg, seed=self.seed)
+
+    def to_bytes(self):
+        cfg = [self.cfg[key] for key in CONFIG_KEYS]
+        return _HEADER.pack(*cfg, self.seed, self._count) + bytes(self._turns)
+
+    # reads a record at the given offset, returning it and the offset after it
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        *cfg, seed, count = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        end = offset + (count + 3) // 4
+        if end > len(data):
+            raise ValueError("replay file is truncated")
+
+        record = cls(dict(zip(CONFIG_KEYS, cfg)), seed, data[offset:end], count)
+        return record, end
+
+
+class ReplayWriter:
+    """
+    Writes game records to a replay file, use as a context manager.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + bytes([VERSION]))
+
+    def write(self, record: GameRecord):
+        self.file.write(record.to_bytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# reads every game record in a replay file
+def read_records(path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a replay file")
+    if data[4] != VERSION:
+        raise ValueError(f"{path} has unsupported replay version {data[4]}")
+
+    records = []
+    offset = 5
+    while offset < len(data):
+        record, offset = GameRecord.from_bytes(data, offset)
+        records.append(record)
+    return records
+
+
+class Replay:
+    """
+    Plays a recorded game again, able to jump to any tick.
+
+    A snapshot of the game is kept every keyframe_interval ticks as the
+    replay plays forward. Seeking starts from the nearest keyframe at or
+    before the tick, so jumping around a game replays at most one interval
+    once every keyframe up to it has been reached.
+    """
+
+    def __init__(self, record: GameRecord, keyframe_interval=50):
+        self.record = record
+        self.keyframe_interval = keyframe_interval
+        self.game = record.new_game()
+        self.tick = 0
+
+        # index of the next turn to play
+        self._turn = 0
+
+        # (snapshot, turn index) at every keyframe_interval ticks
+        self._keyframes = [(self.game.snapshot(), 0)]
+
+    # checks if the recording has been played to the end
+    def finished(self):
+        return self.game.game_over or self._turn >= len(self.record)
+
+    # plays one tick, i.e. a move of every live snake
+    # returns false if the recording has ended
+    def step(self):
+        if self.finished():
+            return False
+
+        game = self.game
+        for i in range(len(game.snakes)):
+            if game.snakes[i].isAlive:
+                if self._turn >= len(self.record):
+                    raise ValueError("recording ends in the middle of a tick")
+                game.move_snake(i, self.record[self._turn])
+                self._turn += 1
+        self.tick += 1
+
+        # keeps a keyframe the first time a keyframe tick is reached
+        if self.tick == len(self._keyframes) * self.keyframe_interval:
+            self._keyframes.append((self.game.snapshot(), self._turn))
+        return True
+
+    # moves the game to the given tick, or the last tick if the game ends
+    # before it, and returns the game
+    def seek(self, tick):
+        k = min(tick // self.keyframe_interval, len(self._keyframes) - 1)
+        start = k * self.keyframe_interval
+        if not start <= self.tick <= tick:
+            snapshot, self._turn = self._keyframes[k]
+            self.game.restore(snapshot)
+            self.tick = start
+
+        while self.tick < tick and self.step():
+            pass
+        return self.game
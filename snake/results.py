@@ -0,0 +1,209 @@
+import json
+import math
+import os
+
+# a results file is json lines:
+#   the header   {"version", "seed", "n", "shard": [i, N]}
+#   a game       {"difficulty", "game", "seed", "score", "moves", "death",
+#                "time"}, in the order they finish
+#   the summary  {"summary": {difficulty: stats}}, once the run is done
+# games are written as they finish, so a run that's stopped early still has
+# every game played so far and can be resumed
+VERSION = 1
+
+# the header values a resumed run has to match
+_RUN_KEYS = ("seed", "n", "shard")
+
+# normal quantile of a 95% confidence interval
+Z_95 = 1.96
+
+
+class ScoreStats:
+    """
+    Count, mean and spread of scores, kept as sums so stats of different
+    runs can be merged exactly.
+    """
+
+    def __init__(self, count=0, total=0, total_sq=0, min=None, max=None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.min = min
+        self.max = max
+
+    def add(self, score):
+        self.count += 1
+        self.total += score
+        self.total_sq += score * score
+        self.min = score if self.min is None else min(self.min, score)
+        self.max = score if self.max is None else max(self.max, score)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    # sample standard deviation
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        var = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(var, 0.0))
+
+    # standard error of the mean
+    def stderr(self):
+        return self.std() / math.sqrt(self.count) if self.count else 0.0
+
+    # half the width of the confidence interval on the mean, 95% by default
+    def ci(self, z=Z_95):
+        return z * self.stderr()
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "total_sq": self.total_sq,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+
+class ResultWriter:
+    """
+    Writes a run's results file a game at a time, use as a context manager.
+
+    With resume, a results file already at path from the same run is added
+    to instead, and done maps the (difficulty, game) of every game in it to
+    its score.
+    """
+
+    def __init__(self, path, seed, n, shard=(1, 1), resume=False):
+        header = {
+            "version": VERSION,
+            "seed": seed,
+            "n": n,
+            "shard": list(shard),
+        }
+        self.done = {}
+
+        if resume and os.path.exists(path):
+            # drops a game cut off halfway through being written
+            with open(path, "rb+") as f:
+                f.truncate(f.read().rfind(b"\n") + 1)
+
+            other, games, _ = read_results(path)
+            if any(other[k] != header[k] for k in _RUN_KEYS):
+                raise ValueError(f"{path} is from a different run")
+            for game in games:
+                self.done[game["difficulty"], game["game"]] = game["score"]
+            self.file = open(path, "a")
+        else:
+            self.file = open(path, "w")
+            self._write(header)
+
+    def write_game(self, result):
+        self._write(
+            {
+                "difficulty": result.difficulty,
+                "game": result.game,
+                "seed": result.seed,
+                "score": result.score,
+                "moves": result.moves,
+                "death": result.death,
+                "time": round(result.seconds, 4),
+            }
+        )
+
+    # stats is difficulty -> ScoreStats
+    def write_summary(self, stats):
+        self._write({"summary": {d: s.to_dict() for d, s in stats.items()}})
+
+    def _write(self, line):
+        self.file.write(json.dumps(line) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# reads a results file, returning its header, games and summary, the summary
+# being None if the run didn't finish and the last one written if resumed
+def read_results(path):
+    # a last line without a newline was cut off while being written
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.endswith("\n")]
+
+    if not lines or lines[0].get("version") != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} results file")
+
+    header, games, summary = lines[0], [], None
+    for line in lines[1:]:
+        if "summary" in line:
+            summary = line["summary"]
+        else:
+            games.append(line)
+    return header, games, summary
+
+
+# merges the results files of the shards of a run into difficulty ->
+# ScoreStats, returning the run's header and the stats
+def merge_results(paths):
+    header = None
+    stats = {}
+    seen = set()
+    for path in paths:
+        other, games, _ = read_results(path)
+        if header is None:
+            header = other
+        elif any(other[k] != header[k] for k in ("seed", "n")):
+            raise ValueError(f"{path} is from a different run than {paths[0]}")
+
+        for game in games:
+            key = (game["difficulty"], game["game"])
+            if key in seen:
+                raise ValueError(f"{path} repeats {key[0]} game {key[1]}")
+            seen.add(key)
+            stats.setdefault(game["difficulty"], ScoreStats()).add(game["score"])
+
+    return header, stats
+
+
+# half the width of the confidence interval on the average of the averages
+# of stats, a dict of difficulty -> ScoreStats
+def average_ci(stats, z=Z_95):
+    variance = sum(s.stderr() ** 2 for s in stats.values())
+    return z * math.sqrt(variance) / len(stats)
+
+
+# prints the summary test_all ends with and returns the final score, the
+# average of the difficulties' averages
+# averages are shown with their 95% confidence intervals
+def print_summary(stats):
+    print("\n" + "=" * 40)
+    print("SUMMARY:")
+    ordered = sorted(stats.items(), key=lambda x: x[1].mean(), reverse=True)
+    for diff, s in ordered:
+        print(f"  {diff:<12} {s.mean():.1f} ± {s.ci():.1f}")
+
+    final_score = sum(s.mean() for s in stats.values()) / len(stats)
+    print("")
+    print(f"  Average Score: {final_score:.1f} ± {average_ci(stats):.1f}")
+    print("=" * 40)
+    return final_score
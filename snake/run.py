@@ -1,46 +1,238 @@
-from snake.logic import SnakeGame
-from snake.render import SnakeRenderer
+import queue
+import random
+import threading
+import time
+
+from snake.logic import SnakeGame, game_seed
+from snake.render import SnakeRenderer, make_frame
+from snake.replay import GameRecord, Replay, ReplayWriter
+from snake.budget import TimedAI
 
 from myAI import myAI
 from examples.smartAI import smartAI as enemyAI
 
 
-def run(cfg):
-    # creates a new snake game
-    game = SnakeGame(
-        width=cfg["width"],
-        height=cfg["height"],
-        num_enemies=cfg["num_enemies"],
-        max_moves=cfg["max_moves"],
-        num_food=cfg["num_food"],
-    )
+class Simulation(threading.Thread):
+    """
+    Plays games on its own thread and hands frames of them to the renderer
+    through a bounded queue.
+
+    A slow AI then can't freeze the window, and a fast one waits for the
+    renderer once the queue is full. Frames are tagged with the number of
+    the game they belong to, so frames of a game that has been restarted can
+    be told apart. With a seed, game n is seeded with game_seed(seed,
+    difficulty, n), so the first game plays out as the first game of snake
+    test with that seed.
+    """
+
+    def __init__(self, cfg, seed=None, difficulty=None, record=False, max_frames=4):
+        super().__init__(daemon=True)
+        self.cfg = cfg
+        self.seed = seed
+        self.difficulty = difficulty
+        self.record = record
+        self.frames = queue.Queue(max_frames)
+
+        # number of the game being played, counting restarts
+        self.games = 0
+
+        # a replay of every game played, if recording
+        self.records = []
+        self.records_lock = threading.Lock()
+
+        # when the tick being played started, or None between ticks
+        self.tick_started = None
+
+        # the player's AI, in a worker process if moves have a time limit
+        limit = cfg.get("move_time_limit")
+        self.player = myAI if limit is None else TimedAI(myAI, limit)
+
+        self._restart_requested = threading.Event()
+        self._stopped = threading.Event()
+
+        # what the AI raised, if it did, which ends the simulation
+        self.error = None
+
+    def restart(self):
+        self.games += 1
+        self._restart_requested.set()
+
+    def stop(self):
+        self._stopped.set()
+
+    # returns the next (game number, frame), or None if there isn't one yet
+    def next_frame(self, timeout=None):
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    # how long the current tick has been running for, in seconds
+    def thinking_for(self):
+        started = self.tick_started
+        return 0.0 if started is None else time.perf_counter() - started
+
+    def run(self):
+        try:
+            self._play()
+        except Exception as e:
+            # kept for run() to raise, raising on this thread only prints it
+            self.error = e
+        finally:
+            self.tick_started = None
+            if isinstance(self.player, TimedAI):
+                self.player.close()
+
+    def _play(self):
+        game = self._new_game()
+        while not self._stopped.is_set():
+            if self._restart_requested.is_set():
+                game = self._new_game()
+
+            # waits for a restart once the game is over
+            if game.game_over:
+                self._restart_requested.wait(0.05)
+                continue
+
+            # moves all the snakes one by one
+            # note that the player's snake is at index 0
+            self.tick_started = time.perf_counter()
+            turns = []
+            for i in range(len(game.snakes)):
+                if game.snakes[i].isAlive:
+                    state = game.getGameState(i)
+                    turn = self.player(state) if i == 0 else enemyAI(state)
+                    game.move_snake(i, turn)
+                    turns.append(turn)
+            self.tick_started = None
+
+            # only whole ticks are recorded, so a replay never stops mid tick
+            if self.record:
+                with self.records_lock:
+                    for turn in turns:
+                        self.records[-1].add(turn)
+
+            self._put_frame(game)
+
+    def _new_game(self):
+        self._restart_requested.clear()
+        number = self.games
+        seed = None
+        if self.seed is not None:
+            seed = game_seed(self.seed, self.difficulty, number)
+
+            # as in snake test, so AIs that use random play the same too
+            random.seed(seed)
+            if isinstance(self.player, TimedAI):
+                self.player.seed(seed)
+
+        game = SnakeGame(
+            width=self.cfg["width"],
+            height=self.cfg["height"],
+            num_enemies=self.cfg["num_enemies"],
+            max_moves=self.cfg["max_moves"],
+            num_food=self.cfg["num_food"],
+            seed=seed,
+        )
+        if self.record:
+            with self.records_lock:
+                self.records.append(GameRecord(self.cfg, seed))
+
+        self._game_number = number
+        self._last_frame = None
+        self._put_frame(game)
+        return game
+
+    # waits for room in the queue, giving up on a restart or stop
+    def _put_frame(self, game):
+        self._last_frame = make_frame(game.getGameState(0), self._last_frame)
+        item = (self._game_number, self._last_frame)
+        while not (self._stopped.is_set() or self._restart_requested.is_set()):
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+# with a record path, every game played is saved there as a replay
+def run(cfg, seed=None, difficulty=None, record=None):
+    # a recorded game has to be seeded to be replayed
+    if record is not None and seed is None:
+        seed = random.randrange(2**32)
+
+    # plays the games on their own thread
+    sim = Simulation(cfg, seed, difficulty, record=record is not None)
+    sim.start()
 
     # creates a new snake renderer
     render = SnakeRenderer(moves_per_second=cfg["moves_per_second"])
+    score = 0
 
     # main loop runs whilst the main window is open
     while render.is_window_open():
 
+        # stops if the AI raised, the error is raised once the window closes
+        if sim.error is not None:
+            break
+
         # handles reset input
         if render.should_restart():
-            game.reset()
+            sim.restart()
             render.reset()
 
-        # if the game is not over
-        if not game.game_over:
+        # gives the renderer the next frame once it has room for it
+        # waits for the very first frame, as the window opens with it, a bit
+        # at a time so an error before it is noticed
+        item = None
+        if not render.is_buffer_full():
+            item = sim.next_frame(0.1 if not render.window_initialized else 0)
 
-            # moves all the snakes one by one
-            # note that the player's snake is at index 0
-            for i in range(len(game.snakes)):
-                if game.snakes[i].isAlive:
-                    state = game.getGameState(i)
-                    turn = myAI(state) if i == 0 else enemyAI(state)
-                    game.move_snake(i, turn)
+        # frames of a game from before a restart are skipped
+        if item is not None and item[0] == sim.games:
+            frame = item[1]
+            score = frame.snake.score
+            render.push(frame)
+            continue
 
-            # gives the processed frame to the renered
-            render.push(game.getGameState(0))
+        # shows the AI is thinking once the renderer has run out of moves
+        thinking = sim.thinking_for()
+        if thinking > render.move_duration and render.is_buffer_empty():
+            render.status = f"thinking... {thinking:.1f}s"
+        else:
+            render.status = None
 
         # updates the renderer
         render.update()
 
-    print(f"Final score: {game.snakes[0].score}")
+    sim.stop()
+    if sim.error is not None:
+        render.close()
+        raise sim.error
+
+    print(f"Final score: {score}")
+
+    if record is not None:
+        with ReplayWriter(record) as writer, sim.records_lock:
+            for r in sim.records:
+                writer.write(r)
+        print(f"Saved {len(sim.records)} game(s) to {record}")
+
+
+# plays back a recorded game from the given tick, R goes back to that tick
+def watch(record: GameRecord, tick=0, moves_per_second=10):
+    replay = Replay(record)
+    render = SnakeRenderer(moves_per_second=moves_per_second)
+    render.push(replay.seek(tick).getGameState(0))
+
+    while render.is_window_open():
+        if render.should_restart():
+            render.reset()
+            render.push(replay.seek(tick).getGameState(0))
+
+        if replay.step():
+            render.push(replay.game.getGameState(0))
+
+        render.update()
+
+    print(f"Final score: {replay.game.snakes[0].score}")
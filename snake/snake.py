@@ -1,13 +1,19 @@
 import argparse
-import random
+import sys
+from contextlib import nullcontext
 import yaml
 import copy
 from tqdm import tqdm
 from snake.logic import SnakeGame, GameState
 from snake.render import SnakeRenderer
 
-from snake.run import run
+from snake.run import run, watch
 from snake.test import test, test_all
+from snake.replay import ReplayWriter, read_records
+from snake.bench import run_bench, DEFAULT_THRESHOLD
+from snake.results import merge_results, print_summary
+from snake.cache import ResultCache
+from snake.compare import compare
 
 # loads configurations
 with open("snake/difficulties.yaml", "r") as f:
@@ -27,6 +33,35 @@ def list_modes():
         )
 
 
+# parses a --shard of the form i/N
+def parse_shard(text):
+    try:
+        i, shards = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text}")
+    if not 1 <= i <= shards:
+        raise argparse.ArgumentTypeError(f"shard {i} isn't between 1 and {shards}")
+    return i, shards
+
+
+def merge(paths, score=None):
+    """Merge the results files of shards of a run"""
+    header, stats = merge_results(paths)
+    for diff, s in stats.items():
+        missing = header["n"] - s.count
+        print(
+            f"  {diff:<12} {s.count} games, {s.mean():.1f} average, "
+            f"{s.min}/{s.max} min/max"
+        )
+        if missing:
+            print(f"    {missing} of {header['n']} games are missing")
+
+    final_score = print_summary(stats)
+    if score is not None:
+        with open(score, "w") as f:
+            f.write(f"score={final_score}")
+
+
 def main():
     parser = argparse.ArgumentParser(prog="snake")
     subparsers = parser.add_subparsers(dest="command")
@@ -35,12 +70,48 @@ def main():
     run_parser = subparsers.add_parser("run")
     run_parser.add_argument("difficulty", nargs="?", default=DEFAULT)
     run_parser.add_argument("--seed", type=int)
+    run_parser.add_argument("--record", metavar="FILE")
 
     # snake test <n> [difficulty]
     test_parser = subparsers.add_parser("test")
     test_parser.add_argument("n", type=int)
     test_parser.add_argument("difficulty", nargs="?", default=DEFAULT)
     test_parser.add_argument("--seed", type=int)
+    test_parser.add_argument("--workers", type=int, default=1)
+    test_parser.add_argument("--record", metavar="FILE")
+    test_parser.add_argument("--timing", action="store_true")
+    test_parser.add_argument("--shard", type=parse_shard, default=(1, 1))
+    test_parser.add_argument("--output", metavar="FILE")
+    test_parser.add_argument("--resume", action="store_true")
+    test_parser.add_argument("--no-cache", action="store_true")
+    test_parser.add_argument("--ci-width", type=float, metavar="WIDTH")
+
+    # snake compare <aiA> <aiB> <n> [difficulty]
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("a")
+    compare_parser.add_argument("b")
+    compare_parser.add_argument("n", type=int)
+    compare_parser.add_argument("difficulty", nargs="?", default=DEFAULT)
+    compare_parser.add_argument("--seed", type=int)
+    compare_parser.add_argument("--workers", type=int, default=1)
+
+    # snake merge <files...>
+    merge_parser = subparsers.add_parser("merge")
+    merge_parser.add_argument("files", nargs="+")
+    merge_parser.add_argument("--score", metavar="FILE")
+
+    # snake replay <file> [game]
+    replay_parser = subparsers.add_parser("replay")
+    replay_parser.add_argument("file")
+    replay_parser.add_argument("game", type=int, nargs="?", default=0)
+    replay_parser.add_argument("--tick", type=int, default=0)
+
+    # snake bench
+    bench_parser = subparsers.add_parser("bench")
+    bench_parser.add_argument("--output", default="bench.json")
+    bench_parser.add_argument("--baseline", default="bench_baseline.json")
+    bench_parser.add_argument("--save-baseline", action="store_true")
+    bench_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
 
     # snake list
     subparsers.add_parser("list")
@@ -53,10 +124,6 @@ def main():
         parser.print_help()
         return
 
-    # Set seed if provided
-    if hasattr(args, "seed") and args.seed:
-        random.seed(args.seed)
-
     # user has asked to run a game
     if args.command == "run":
         if args.difficulty not in DIFFICULTIES:
@@ -65,19 +132,107 @@ def main():
             return
 
         print("Controls: R=restart, ESC=quit")
-        run(cfg=DIFFICULTIES[args.difficulty])
+        run(DIFFICULTIES[args.difficulty], args.seed, args.difficulty, args.record)
 
     # user has asked to test their AI
     elif args.command == "test":
-        if args.difficulty == "all":
-            test_all(args.n, DIFFICULTIES)
+        if args.difficulty != "all" and args.difficulty not in DIFFICULTIES:
+            print(f"Unknown difficulty: {args.difficulty}")
+            list_modes()
+            return
+
+        # every shard has to play from the same seed
+        if args.shard != (1, 1) and args.seed is None:
+            print("--shard needs a --seed shared by every shard")
+            return
+        if args.resume and args.output is None:
+            print("--resume needs the --output of the run to resume")
+            return
+        if args.ci_width is not None and args.shard != (1, 1):
+            print("--ci-width stops each shard on its own, so can't be sharded")
+            return
+        if args.shard[1] > args.n:
+            print(f"Can't split {args.n} games into {args.shard[1]} shards")
+            return
 
-        elif args.difficulty not in DIFFICULTIES:
+        # records the games if asked to, and reuses the results of games
+        # played before unless asked not to
+        recording = ReplayWriter(args.record) if args.record else nullcontext()
+        caching = nullcontext() if args.no_cache else ResultCache()
+        with recording as writer, caching as cache:
+            if args.difficulty == "all":
+                test_all(
+                    args.n,
+                    DIFFICULTIES,
+                    args.seed,
+                    args.workers,
+                    writer,
+                    args.timing,
+                    args.shard,
+                    args.output,
+                    args.resume,
+                    cache,
+                    args.ci_width,
+                )
+
+            else:
+                test(
+                    args.n,
+                    args.difficulty,
+                    DIFFICULTIES,
+                    args.seed,
+                    args.workers,
+                    writer,
+                    args.timing,
+                    args.shard,
+                    args.output,
+                    args.resume,
+                    cache,
+                    args.ci_width,
+                )
+
+    # user has asked to compare two AIs
+    elif args.command == "compare":
+        if args.difficulty != "all" and args.difficulty not in DIFFICULTIES:
             print(f"Unknown difficulty: {args.difficulty}")
             list_modes()
+            return
+
+        compare(
+            args.a,
+            args.b,
+            args.n,
+            args.difficulty,
+            DIFFICULTIES,
+            args.seed,
+            args.workers,
+        )
+
+    # user has asked to merge the results of shards
+    elif args.command == "merge":
+        merge(args.files, args.score)
+
+    # user has asked to watch a recorded game
+    elif args.command == "replay":
+        records = read_records(args.file)
+        if not 0 <= args.game < len(records):
+            print(f"{args.file} has {len(records)} game(s)")
+            return
 
-        else:
-            test(args.n, args.difficulty, DIFFICULTIES)
+        print("Controls: R=restart, ESC=quit")
+        watch(records[args.game], args.tick)
+
+    # user has asked to benchmark the engine
+    elif args.command == "bench":
+        ok = run_bench(
+            DIFFICULTIES,
+            args.output,
+            args.baseline,
+            args.save_baseline,
+            args.threshold,
+        )
+        if not ok:
+            sys.exit(1)
 
     # user has asked to list the difficulties
     elif args.command == "list":
@@ -1,68 +1,519 @@
+import importlib
+import importlib.util
+import os
+import random
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from itertools import chain
+
 from tqdm import tqdm
 
-from snake.logic import SnakeGame
+from snake.logic import SnakeGame, game_seed
 from snake.render import SnakeRenderer
+from snake.replay import GameRecord
+from snake.latency import GameTimings
+from snake.budget import TimedAI
+from snake.results import ResultWriter, ScoreStats, print_summary, read_results
 
 from myAI import myAI
 from examples.smartAI import smartAI as enemyAI
 
+# games played before stopping early, so the spread of scores is known well
+# enough to trust the confidence interval
+MIN_GAMES = 30
+
+# one game to play
+@dataclass
+class GameTask:
+    difficulty: str
+
+    # the game's number within its difficulty
+    game: int
+    cfg: dict
+    seed: int
+
+    # whether to keep the game's record and timings
+    record: bool = False
+    timing: bool = False
+
+    # the player's AI as given to load_ai, or None for myAI
+    player: str = None
+
+
+# what playing one game gives back
+@dataclass
+class GameResult:
+    difficulty: str
+    game: int
+    seed: int
+    player: str = None
+    score: int = 0
+    record: GameRecord = None
+    timings: GameTimings = None
+
+    # moves the player survived, what it died of if it did and how long the
+    # game took in seconds
+    moves: int = 0
+    death: str = None
+    seconds: float = 0.0
+
+    # moves the player's AI didn't make within the time limit
+    timeouts: int = 0
+
+    # whether the result came from a ResultCache rather than playing the game
+    cached: bool = False
+
+
+# plays a game without rendering, adding its turns to record if given
+# and how long the AIs and engine took to timings if given
+# returns the finished game and what the player died of, see blocked_by
+def run_no_viz(
+    cfg,
+    seed=None,
+    record=None,
+    timings=None,
+    player=myAI,
+):
+    # the board only draws from the game's own rng, seeding random as well
+    # keeps AIs that use random reproducible too
+    if seed is not None:
+        random.seed(seed)
+        if isinstance(player, TimedAI):
+            player.seed(seed)
 
-def run_no_viz(cfg):
     game = SnakeGame(
         width=cfg["width"],
         height=cfg["height"],
         num_enemies=cfg["num_enemies"],
         max_moves=cfg["max_moves"],
         num_food=cfg["num_food"],
+        seed=seed,
     )
 
+    clock = time.perf_counter
+    death = None
     while not game.game_over:
+        engine = 0.0
         for i in range(len(game.snakes)):
             if game.snakes[i].isAlive:
+                start = clock()
                 state = game.getGameState(i)
-                turn = myAI(state) if i == 0 else enemyAI(state)
+                thinking = clock()
+                turn = player(state) if i == 0 else enemyAI(state)
+                decided = clock()
+                if i == 0:
+                    snake = game.snakes[0]
+                    death = game.blocked_by(snake, snake.get_next_head(turn))
                 game.move_snake(i, turn)
+                engine += clock() - decided + thinking - start
+
+                if record is not None:
+                    record.add(turn)
+                if timings is not None:
+                    ai = timings.player if i == 0 else timings.enemy
+                    ai.add(decided - thinking)
+
+        if timings is not None:
+            timings.engine.add(engine)
+
+    return game, death
+
+
+# the AIs loaded by this process, by spec
+_ais = {}
+
+
+# loads an AI from a spec of the form module or path/to/file.py, optionally
+# followed by :function, which defaults to the function named like the module
+# or else myAI, e.g. examples.smartAI or old/myAI.py:lookAhead
+def load_ai(spec):
+    if spec not in _ais:
+        target, _, name = spec.partition(":")
+        if target.endswith(".py"):
+            module_name = os.path.splitext(os.path.basename(target))[0]
+            module_spec = importlib.util.spec_from_file_location(module_name, target)
+            if module_spec is None:
+                raise ValueError(f"can't load an AI from {target}")
+            module = importlib.util.module_from_spec(module_spec)
+            module_spec.loader.exec_module(module)
+        else:
+            module_name = target.rpartition(".")[2]
+            module = importlib.import_module(target)
+
+        if not name:
+            name = module_name if hasattr(module, module_name) else "myAI"
+        _ais[spec] = getattr(module, name)
+    return _ais[spec]
+
+
+# the player's AIs of this process with a time limit, by spec and limit
+# kept between games so their worker processes are reused
+_timed_ais = {}
+
+
+def _timed_ai(spec, limit):
+    if (spec, limit) not in _timed_ais:
+        ai = myAI if spec is None else load_ai(spec)
+        _timed_ais[spec, limit] = TimedAI(ai, limit)
+    return _timed_ais[spec, limit]
+
+
+def _player(task: GameTask):
+    limit = task.cfg.get("move_time_limit")
+    if limit is not None:
+        return _timed_ai(task.player, limit)
+    return myAI if task.player is None else load_ai(task.player)
+
+
+# plays a single game, the record and timings are only kept if asked for
+def _play(task: GameTask):
+    player = _player(task)
+    timeouts = getattr(player, "timeouts", 0)
+
+    result = GameResult(task.difficulty, task.game, task.seed, task.player)
+    if task.record:
+        result.record = GameRecord(task.cfg, task.seed)
+    if task.timing:
+        result.timings = GameTimings()
+
+    start = time.perf_counter()
+    game, result.death = run_no_viz(
+        task.cfg, task.seed, result.record, result.timings, player
+    )
+    result.seconds = time.perf_counter() - start
+    result.score = game.snakes[0].score
+    result.moves = game.moves
+    result.timeouts = getattr(player, "timeouts", 0) - timeouts
+    return result
+
+
+# runs as each worker starts, which imports this module and with it the AIs,
+# and starts the timed AI workers the games will need
+def _warm_up(limits):
+    for limit in limits:
+        _timed_ai(None, limit).start()
+
+
+# yields the results of futures as they finish
+def _finished(futures):
+    for future in as_completed(futures):
+        yield future.result()
+
+
+class Batch:
+    """
+    The results of games queued on a GamePool, iterated in the order they
+    finish. Games not started yet can be cancelled.
+    """
 
-    return game.snakes[0].score
+    def __init__(self, results, futures=()):
+        self._results = results
+        self._futures = futures
 
+    def __iter__(self):
+        return self._results
 
-def test(n, difficulty, DIFFICULTIES):
-    scores = []
-    with tqdm(total=n, desc=f"Testing {difficulty}", unit="game") as pbar:
-        for i in range(n):
-            score = run_no_viz(DIFFICULTIES[difficulty])
-            scores.append(score)
-            pbar.set_postfix({"last": score, "avg": f"{sum(scores)/len(scores):.1f}"})
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+
+
+class GamePool:
+    """
+    Worker processes that play games, kept for as long as the pool is open.
+
+    The AIs are imported once per worker, and their caches and timed AI
+    workers are kept between games and difficulties. Games are queued one
+    by one and a worker takes the next game as soon as it's free, so a slow
+    chaos game never leaves the other workers idle while games are queued.
+    With one worker, games are played in this process as they're iterated.
+    Use as a context manager.
+    """
+
+    def __init__(self, workers=1, DIFFICULTIES=None):
+        self.workers = workers
+        self._executor = None
+        if workers > 1:
+            configs = (DIFFICULTIES or {}).values()
+            limits = {cfg.get("move_time_limit") for cfg in configs} - {None}
+            self._executor = ProcessPoolExecutor(
+                workers, initializer=_warm_up, initargs=(limits,)
+            )
+
+    # queues the games, returning a Batch of their GameResults
+    # done are results of games already known, which come first
+    def submit(self, tasks, done=()):
+        if self._executor is None:
+            return Batch(chain(done, map(_play, tasks)))
+        futures = [self._executor.submit(_play, task) for task in tasks]
+        return Batch(chain(done, _finished(futures)), futures)
+
+    def close(self, cancel=False):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=cancel)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(cancel=exc_type is not None)
+
+
+# the games of a difficulty, or of shard i of N of them, which plays
+# games i - 1, i - 1 + N, i - 1 + 2N and so on
+def _tasks(n, difficulty, DIFFICULTIES, seed, writer, timing, shard):
+    cfg = DIFFICULTIES[difficulty]
+    i, shards = shard
+    return [
+        GameTask(
+            difficulty,
+            game,
+            cfg,
+            game_seed(seed, difficulty, game),
+            record=writer is not None,
+            timing=timing,
+        )
+        for game in range(i - 1, n, shards)
+    ]
+
+
+# splits tasks into the games still to play and the stats of the games
+# already in the results file being resumed
+def _resume(tasks, output):
+    stats = ScoreStats()
+    if output is None:
+        return tasks, stats
+
+    todo = []
+    for task in tasks:
+        score = output.done.get((task.difficulty, task.game))
+        if score is None:
+            todo.append(task)
+        else:
+            stats.add(score)
+    return todo, stats
+
+
+# plays the tasks on the pool, taking the results of games in the cache from
+# it instead, returning a Batch of their results
+def _submit(pool, tasks, cache):
+    if cache is None:
+        return pool.submit(tasks)
+    tasks, cached = cache.lookup(tasks)
+    return pool.submit(tasks, cached)
+
+
+# yields results in the order of their tasks' games, holding back those
+# that finish before the games ahead of them
+# games that finish first tend to be the short, low scoring ones, so
+# stopping on whichever have finished would bias the average
+def _in_game_order(results, tasks):
+    waiting = {}
+    order = iter(sorted(task.game for task in tasks))
+    next_game = next(order, None)
+    for result in results:
+        waiting[result.game] = result
+        while next_game in waiting:
+            yield waiting.pop(next_game)
+            next_game = next(order, None)
+
+
+# whether stats are precise enough to stop at, a confidence interval no wider
+# than ci_width from at least MIN_GAMES games
+def _converged(stats, ci_width):
+    return stats.count >= MIN_GAMES and 2 * stats.ci() <= ci_width
+
+
+# gathers the results of one difficulty's games as they finish, adding them
+# to stats, the cache and output if given, and prints a summary of them
+# with ci_width, stops once the confidence interval is that narrow, taking
+# the games in order and cancelling the rest
+def _report(
+    difficulty,
+    cfg,
+    tasks,
+    results,
+    stats,
+    writer=None,
+    timing=False,
+    output=None,
+    cache=None,
+    ci_width=None,
+):
+    records = {}
+    timings = GameTimings()
+    timeouts = 0
+    cached = 0
+    total = stats.count + len(tasks)
+    desc = f"Testing {difficulty}"
+
+    # stopping early takes the games in order, a resumed run may have
+    # converged already
+    stopped = False
+    in_order = results
+    if ci_width is not None:
+        stopped = _converged(stats, ci_width)
+        in_order = () if stopped else _in_game_order(results, tasks)
+
+    with tqdm(total=total, initial=stats.count, desc=desc, unit="game") as pbar:
+        for result in in_order:
+            score = result.score
+            stats.add(score)
+            timeouts += result.timeouts
+            cached += result.cached
+            if output is not None:
+                output.write_game(result)
+            if cache is not None:
+                cache.store(result)
+            if result.record is not None:
+                records[result.seed] = result.record
+            if result.timings is not None:
+                timings.merge(result.timings)
+            pbar.set_postfix({"last": score, "avg": f"{stats.mean():.1f}"})
             pbar.update(1)
 
-    avg = sum(scores) / len(scores)
+            if ci_width is not None and _converged(stats, ci_width):
+                stopped = True
+                break
+
+    if stopped:
+        results.cancel()
+
+    # a resumed or stopped run only has records of the games played
+    if writer is not None:
+        for task in tasks:
+            if task.seed in records:
+                writer.write(records[task.seed])
+
     print(f"\nResults:")
-    print(f"  Games: {len(scores)}")
-    print(f"  Average: {avg:.1f}")
-    print(f"  Min/Max: {min(scores)}/{max(scores)}")
-    return avg
+    print(f"  Games: {stats.count}")
+    print(f"  Average: {stats.mean():.1f} ± {stats.ci():.1f} (95% CI)")
+    print(f"  Min/Max: {stats.min}/{stats.max}")
+    if cached:
+        print(f"  Cached: {cached} of {len(tasks)} games")
+    if stopped:
+        print(f"  Stopped early, the CI is narrower than {ci_width}")
+    if "move_time_limit" in cfg:
+        print(f"  Timeouts: {timeouts} (limit {cfg['move_time_limit']}s per move)")
+    if timing:
+        timings.print_report()
+        if "move_time_limit" in cfg:
+            print("    (player move includes the round trip to the AI's process)")
+
 
+# a ResultWriter for output, or a stand in that writes nothing
+def _result_writer(output, seed, n, shard, resume):
+    if output is None:
+        return nullcontext()
+    return ResultWriter(output, seed, n, shard, resume)
 
-def test_all(n, DIFFICULTIES):
+
+# the seed of a run, taken from the results file when resuming without one
+def _run_seed(seed, output, resume):
+    if seed is None and resume and output and os.path.exists(output):
+        seed = read_results(output)[0]["seed"]
+    if seed is None:
+        seed = random.randrange(2**32)
+    return seed
+
+
+# writer is a ReplayWriter to record the games to, in game order
+# timing reports how long the AIs take per move and the engine per tick
+# shard (i, N) plays only the i-th of N interleaved parts of the games
+# output is a results file to write every game's score to, see snake merge
+# resume adds to the output of an unfinished run, skipping the games in it
+# cache is a ResultCache to take the results of games played before from
+# ci_width plays until the 95% confidence interval on the average is that
+# wide, with n as the most games to play
+def test(
+    n,
+    difficulty,
+    DIFFICULTIES,
+    seed=None,
+    workers=1,
+    writer=None,
+    timing=False,
+    shard=(1, 1),
+    output=None,
+    resume=False,
+    cache=None,
+    ci_width=None,
+):
+    seed = _run_seed(seed, output, resume)
+    cfg = DIFFICULTIES[difficulty]
+    tasks = _tasks(n, difficulty, DIFFICULTIES, seed, writer, timing, shard)
+
+    with _result_writer(output, seed, n, shard, resume) as results:
+        tasks, stats = _resume(tasks, results)
+        with GamePool(workers, DIFFICULTIES) as pool:
+            finished = _submit(pool, tasks, cache)
+            _report(
+                difficulty,
+                cfg,
+                tasks,
+                finished,
+                stats,
+                writer,
+                timing,
+                results,
+                cache,
+                ci_width,
+            )
+        if results is not None:
+            results.write_summary({difficulty: stats})
+    return stats.mean()
+
+
+def test_all(
+    n,
+    DIFFICULTIES,
+    seed=None,
+    workers=1,
+    writer=None,
+    timing=False,
+    shard=(1, 1),
+    output=None,
+    resume=False,
+    cache=None,
+    ci_width=None,
+):
     """Test all difficulty levels"""
-    results = {}
+    seed = _run_seed(seed, output, resume)
+
+    stats = {}
     print(f"\nTesting all difficulties ({n} games each)")
     print("=" * 40)
 
-    for diff in DIFFICULTIES:
-        results[diff] = test(n, diff, DIFFICULTIES)
-        print("")
+    with _result_writer(output, seed, n, shard, resume) as results:
+        # queues every difficulty's games at once on one pool, so workers go
+        # straight on to the next difficulty while the last games of one finish
+        with GamePool(workers, DIFFICULTIES) as pool:
+            batches = {}
+            for diff in DIFFICULTIES:
+                tasks = _tasks(n, diff, DIFFICULTIES, seed, writer, timing, shard)
+                tasks, stats[diff] = _resume(tasks, results)
+                batches[diff] = (tasks, _submit(pool, tasks, cache))
 
-    print("\n" + "=" * 40)
-    print("SUMMARY:")
-    for diff, avg in sorted(results.items(), key=lambda x: x[1], reverse=True):
-        print(f"  {diff:<12} {avg:.1f}")
+            for diff, (tasks, finished) in batches.items():
+                _report(
+                    diff,
+                    DIFFICULTIES[diff],
+                    tasks,
+                    finished,
+                    stats[diff],
+                    writer,
+                    timing,
+                    results,
+                    cache,
+                    ci_width,
+                )
+                print("")
 
-    final_score = (
-        (results["easy"] + results["medium"] + results["hard"] + results["chaos"]) / 4
-    )
-    print("")
-    print(f"  Average Score: {final_score:.1f}")
-    print("=" * 40)
+        if results is not None:
+            results.write_summary(stats)
 
-    return results
+    print_summary(stats)
+    return {diff: s.mean() for diff, s in stats.items()}
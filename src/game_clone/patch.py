@@ -1,8 +1,9 @@
+import random
 
-from src.game_clone.logic import SnakeGame as ClonedSnakeGame
+from snake.logic import SnakeGame as BaseSnakeGame
 from snake.logic import GameState
 
-class SnakeGame(ClonedSnakeGame):
+class SnakeGame(BaseSnakeGame):
     def __init__(self, state: GameState):
         self.setGameState(state)
 
@@ -19,24 +20,16 @@ class SnakeGame(ClonedSnakeGame):
             food=self.food,
             walls=self.walls,
             score=self.snakes[idx].score,
+            owners=self._owners,
         )
 
     # patch add function to clone game
+    # patch: set self to always be idx 0
+    # snakes are copied, the board is rebuilt from the state without a deepcopy
+    # invalid_wall_cache starts empty, as the cache is not shared with game
+    # the simulation is seeded from random, so seeded test runs stay reproducible
     def setGameState(self, state: GameState):
-        import copy
-        state = copy.deepcopy(state)
-        self.width = state.width
-        self.height = state.height
-        # patch: set self to always be idx 0
-        self.snakes = [state.snake] + state.enemies
-        self.food = state.food
-        self.walls = state.walls
-        self.game_over = False
-        self.num_enemies = len(state.enemies)
-        self.num_food = len(state.food)
-        self.max_moves = 64
-        self.moves = 0
-        self.invalid_wall_cache = set() # not correct, as cache is not shared with game
+        self._load_state(state, max_moves=64, seed=random.getrandbits(64))
         
 
 